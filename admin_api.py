@@ -1,16 +1,30 @@
 import os
 import logging
 import re
+import asyncio
 import boto3
 import shutil
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 import pdfplumber
 from PyPDF2 import PdfReader, PdfWriter
-from fastapi import FastAPI, File, UploadFile
+from fastapi import FastAPI, File, HTTPException, Query, UploadFile
 from dotenv import load_dotenv
 from pdf2jpg import pdf2jpg
-from utils import Data_extractor,TimeTableProcessor,inverse_course_mapping
-from sqlalchemy import create_engine, except_
+from utils import Data_extractor,TimeTableProcessor,inverse_course_mapping,extract_cabin_page
+from sqlalchemy import create_engine, except_, text
 import pandas as pd
+import metrics
+from metrics import DB_QUERY_SECONDS
+from profiling import NULL_PROFILER, IngestProfiler, ingest_stage, profiling_requested
+from events import notify_params, notify_query
+from versions import (VERSION_DDL, VERSION_MIGRATIONS, ActivationRefused, activate_version_queries,
+                      active_version_query, list_versions_query, make_version, register_version_query,
+                      schema_for, version_schema_query)
+from validation import validate_timetable
+from sqlite_snapshot import MANIFEST_KEY, TIMETABLE_TABLES, manifest_body, snapshot_key, write_sqlite
 
 # Load environment variables
 load_dotenv()
@@ -21,12 +35,14 @@ logger = logging.getLogger(__name__)
 
 # Initialize FastAPI
 app = FastAPI()
+metrics.install(app, "admin_api")
 
 DATABASE_URL = os.environ.get("supabase_uri_non_async")
+# Export every timetable version as a SQLite snapshot for SNAPSHOT_MODE=local read replicas
+SNAPSHOT_EXPORT = os.getenv("SNAPSHOT_EXPORT", "true").lower() == "true"
 
-# Create Async SQLAlchemy Engine
-
-
+# One pooled engine shared by every ingest path; its blocking calls run in worker threads
+engine = create_engine(DATABASE_URL, pool_pre_ping=True)
 
 # AWS S3 Configuration
 s3_client = boto3.client(
@@ -45,55 +61,340 @@ os.makedirs(EXTRACTED_FOLDER, exist_ok=True)
 os.makedirs(image_output, exist_ok=True)
 
 
+# Indexes for each snapshot schema (`{schema}` is filled in by load_timetable)
+TIMETABLE_INDEXES = [
+    '''CREATE INDEX IF NOT EXISTS faculty_free_slots_lookup_idx ON "{schema}".faculty_free_slots ("Faculty", day_id, start_time)''',
+    '''CREATE INDEX IF NOT EXISTS room_free_slots_lookup_idx ON "{schema}".room_free_slots ("Day", start_time, end_time)''',
+    '''CREATE UNIQUE INDEX IF NOT EXISTS days_db_day_idx ON "{schema}".days_db ("Day")''',
+]
+
+
+def load_timetable(dbs: dict, term: str, report: dict) -> str:
+    """Writes the processed tables into a new snapshot schema and registers it with its validation result;
+    returns the version."""
+    version = make_version(term)
+    schema = schema_for(version)
+    # One transaction: a version id or schema that already exists fails before any table is written,
+    # and a failed load leaves neither a half-written schema nor a registered version behind
+    with engine.begin() as connection:
+        for statement in VERSION_DDL:
+            connection.execute(text(statement))
+        connection.execute(text(register_version_query),
+                           {"version": version, "term": term, "schema_name": schema,
+                            "validation_ok": report["ok"], "empty_timetable": report["empty_timetable"]})
+        connection.execute(text(f'CREATE SCHEMA "{schema}"'))
+        for name, df in dbs.items():
+            df.to_sql(name, con=connection, schema=schema, if_exists='fail', index=False)
+        for statement in TIMETABLE_INDEXES:
+            connection.execute(text(statement.format(schema=schema)))
+    return version
+
+
+def activate(version: str, force: bool = False) -> str:
+    """Atomically points the read API at `version` and notifies its instances; returns the schema.
+
+    An empty version is always refused. A version that failed validation and has never been live
+    is refused unless `force` is set; versions that were served before can always be rolled back to.
+    """
+    with engine.begin() as connection:
+        for statement in VERSION_DDL:
+            connection.execute(text(statement))
+        row = connection.execute(text(version_schema_query), {"version": version}).first()
+        if row is None:
+            raise ValueError(f"Unknown timetable version: {version}")
+        if row.empty_timetable:
+            raise ActivationRefused(f"Version {version} has no timetable rows and cannot be activated")
+        # NULL for versions registered before validation results were stored
+        if row.validation_ok is False and row.activated_at is None and not force:
+            raise ActivationRefused(f"Version {version} failed validation; pass force=true to activate it anyway")
+        schema = row.schema_name
+        for statement in activate_version_queries:
+            connection.execute(text(statement), {"version": version})
+        # Delivered on commit, together with the pointer flip; the only event for a live timetable change
+        connection.execute(notify_query, notify_params("timetable_updated", version=version, schema=schema))
+    return schema
+
+
+def export_snapshot(version: str, frames: dict) -> bool:
+    """Uploads `version` (its timetable tables plus the current cabin_db) to S3 as a SQLite file."""
+    if not SNAPSHOT_EXPORT:
+        return False
+    path = os.path.join(EXTRACTED_FOLDER, f"{version}.sqlite")
+    try:
+        with engine.begin() as connection:
+            for statement in CABIN_DDL:
+                connection.execute(text(statement))
+            cabins = pd.read_sql(text('''SELECT "Faculty", cabin, faculty_key FROM cabin_db'''), connection)
+        write_sqlite({**frames, "cabin_db": cabins}, path)
+        with metrics.external_call("s3", "upload_snapshot"):
+            s3_client.upload_file(path, os.getenv("AWS_BUCKET_NAME"), snapshot_key(version))
+        logger.info(f"Exported snapshot {snapshot_key(version)}")
+        return True
+    except Exception as e:
+        logger.error(f"Error exporting snapshot {version}: {e}")
+        return False
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def publish_snapshot(version: str):
+    """Points the snapshot manifest at `version` and tells read replicas to fetch it."""
+    if not SNAPSHOT_EXPORT:
+        return
+    try:
+        with metrics.external_call("s3", "put_snapshot_manifest"):
+            s3_client.put_object(Bucket=os.getenv("AWS_BUCKET_NAME"), Key=MANIFEST_KEY,
+                                 Body=manifest_body(version), ContentType="application/json")
+        publish_event("snapshot_published", version=version)
+    except Exception as e:
+        logger.error(f"Error publishing snapshot manifest for {version}: {e}")
+
+
+def refresh_active_snapshot() -> bool:
+    """Re-exports the live version from Postgres and publishes it; used on activation and after cabin_db changed."""
+    if not SNAPSHOT_EXPORT:
+        return False
+    try:
+        with engine.begin() as connection:
+            for statement in VERSION_DDL:
+                connection.execute(text(statement))
+            row = connection.execute(text(active_version_query)).first()
+            if row is None:
+                return False
+            version, schema = row
+            frames = {name: pd.read_sql_table(name, connection, schema=schema) for name in TIMETABLE_TABLES}
+    except Exception as e:
+        logger.error(f"Error reading the active version for snapshot export: {e}")
+        return False
+    # Only move the manifest once the file it points at is in S3
+    if not export_snapshot(version, frames):
+        return False
+    publish_snapshot(version)
+    return True
+
+
 @app.post("/upload-shchedule-to-DB/")
-async def upload_pdf(file: UploadFile = File(...)):
-    """Endpoint to upload and process a timetable PDF."""
+async def upload_pdf(file: UploadFile = File(...), term: str = "current", activate_now: bool = Query(True, alias="activate"),
+                     profile: bool = False, strict: bool = False):
+    """Endpoint to upload and process a timetable PDF.
+
+    The tables are stored as a new version of `term`; pass `activate=false` to stage it and
+    switch later with /activate-version/.
+    The response carries a validation report (dropped cells, unmapped courses, unresolved rows,
+    room and faculty conflicts). With `strict=true` a version with any such issue is stored but not activated; a PDF
+    that yields no timetable rows is never activated.
+    With `profile=true` (or INGEST_PROFILE=true) every ingest stage is run under cProfile;
+    the profiles are saved under INGEST_PROFILE_DIR and the per-stage summary is returned.
+    """
     try:
         pdf_path = os.path.join(UPLOAD_FOLDER, file.filename)
         with open(pdf_path, "wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
 
-        # Process PDF
+        profiler = NULL_PROFILER
+        if profiling_requested(profile):
+            run_name = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.path.splitext(file.filename)[0]}"
+            profiler = IngestProfiler(run_name)
+
+        # Parsing, loading and the S3/NOTIFY calls all block, so the whole ingest runs off the event loop
+        return await asyncio.to_thread(ingest_timetable, pdf_path, term, activate_now, strict, profiler)
+    except Exception as e:
+        return {"message": e}
 
-        processor = TimeTableProcessor(
-            Data_extractor(pdf_path, course_mapping).extracted, course_mapping
-        )
+
+def ingest_timetable(pdf_path: str, term: str, activate_now: bool, strict: bool, profiler) -> dict:
+    """Processes, validates, stores and (optionally) activates an uploaded timetable PDF."""
+    try:
+        # Process PDF
+        extractor = Data_extractor(pdf_path, course_mapping, profiler)
+        processor = TimeTableProcessor(extractor.extracted, course_mapping, profiler)
         dbs = processor.process_all()
+        with ingest_stage("validation", profiler):
+            report = validate_timetable(dbs, extractor.dropped_cells, extractor.unmapped_courses)
+        if not report["ok"]:
+            logger.warning(f"Timetable validation issues: {report['counts']}")
+        # An empty timetable would wipe the live data, so it is never activated, strict or not
+        blocked = report["empty_timetable"] or (strict and not report["ok"])
+        activate_now = activate_now and not blocked
 
         # Update database
-        engine = create_engine(DATABASE_URL)
-        # Use `engine.connect()` in a `with` statement
-        with engine.connect() as connection:
-            for name, df in dbs.items():
-                df.to_sql(name, con=connection, if_exists='replace', index=False)
+        with ingest_stage("db_load", profiler), DB_QUERY_SECONDS.time(query="timetable_load"):
+            version = load_timetable(dbs, term, report)
         os.remove(pdf_path)
-        return {"message": "Timetable processed successfully!"}
+        if activate_now:
+            # Non-strict uploads go live despite validation issues; activate() still refuses an empty one
+            activate(version, force=not strict)
+            # Staged versions are exported when they are activated, with the cabin_db of that moment
+            with ingest_stage("snapshot_export", profiler):
+                if export_snapshot(version, dbs):
+                    publish_snapshot(version)
+        response = {"message": "Timetable processed successfully!", "version": version, "active": activate_now,
+                    "validation": report}
+        if report["empty_timetable"]:
+            response["message"] = "Timetable stored but not activated: no timetable rows were extracted"
+        elif blocked:
+            response["message"] = "Timetable stored but not activated: validation found issues"
+    finally:
+        # Saved even when ingest fails: a slow upload that errors out is the one worth profiling
+        if profiler is not NULL_PROFILER:
+            profile_summary = profiler.save()
+            logger.info(f"Ingest profile saved to {profile_summary['profile_dir']}")
+    if profiler is not NULL_PROFILER:
+        response["profile"] = profile_summary
+    return response
+
+
+@app.post("/activate-version/")
+async def activate_version(version: str = Query(..., description="Timetable version to serve"),
+                           force: bool = Query(False, description="Activate even though validation failed")):
+    """Switches the live timetable to `version` (also used to roll back).
+
+    Returns 409 for an empty version, and for a never-activated version that failed
+    validation unless `force=true`.
+    """
+    try:
+        schema = await asyncio.to_thread(activate, version, force)
+        # Re-exported rather than reusing an older file: cabin_db may have changed since ingest
+        await asyncio.to_thread(refresh_active_snapshot)
+        return {"message": "Version activated", "version": version, "schema": schema}
+    except ActivationRefused as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@app.get("/versions/")
+def list_versions():
+    """Lists stored timetable versions, newest first."""
+    with engine.begin() as connection:
+        for statement in VERSION_DDL:
+            connection.execute(text(statement))
+        rows = connection.execute(text(list_versions_query)).fetchall()
+    return [dict(row._mapping) for row in rows]
+
+# cabin_db is keyed on the normalized faculty name so the availability query can use an index.
+# Cheap, idempotent DDL run on the request path; it takes no lock on an existing cabin_db.
+CABIN_DDL = [
+    '''CREATE TABLE IF NOT EXISTS cabin_db ("Faculty" TEXT, cabin TEXT, faculty_key TEXT)''',
+    '''CREATE UNIQUE INDEX IF NOT EXISTS cabin_db_faculty_key_idx ON cabin_db (faculty_key)''',
+]
+
+# Migrates tables created by the old `to_sql(if_exists="replace")` path. The ALTER takes an ACCESS
+# EXCLUSIVE lock and the UPDATE/DELETE scan the table, so this only runs once, at startup.
+CABIN_MIGRATIONS = [
+    '''CREATE TABLE IF NOT EXISTS cabin_db ("Faculty" TEXT, cabin TEXT, faculty_key TEXT)''',
+    '''ALTER TABLE cabin_db ADD COLUMN IF NOT EXISTS faculty_key TEXT''',
+    '''UPDATE cabin_db SET faculty_key = LOWER(BTRIM(REGEXP_REPLACE("Faculty", '\\s+', ' ', 'g')))
+       WHERE faculty_key IS NULL''',
+    '''DELETE FROM cabin_db WHERE faculty_key IS NULL''',
+    '''DELETE FROM cabin_db a USING cabin_db b WHERE a.faculty_key = b.faculty_key AND a.ctid < b.ctid''',
+    '''CREATE UNIQUE INDEX IF NOT EXISTS cabin_db_faculty_key_idx ON cabin_db (faculty_key)''',
+]
+
+
+@app.on_event("startup")
+def migrate_cabin_db():
+    """Brings cabin_db up to the faculty_key schema the read API's lookups need."""
+    try:
+        with engine.begin() as connection:
+            for statement in CABIN_MIGRATIONS:
+                connection.execute(text(statement))
     except Exception as e:
-        return {"message": e}
+        logger.error(f"cabin_db migration failed: {e}")
+
+
+@app.on_event("startup")
+def migrate_version_registry():
+    """Adds the validation columns activate() checks to an existing timetable_versions."""
+    try:
+        with engine.begin() as connection:
+            for statement in VERSION_DDL + VERSION_MIGRATIONS:
+                connection.execute(text(statement))
+    except Exception as e:
+        logger.error(f"timetable_versions migration failed: {e}")
+
+
+cabin_upsert_query = """
+INSERT INTO cabin_db ("Faculty", cabin, faculty_key)
+VALUES (:Faculty, :cabin, :faculty_key)
+ON CONFLICT (faculty_key) DO UPDATE
+SET "Faculty" = EXCLUDED."Faculty", cabin = EXCLUDED.cabin
+"""
+
+
+# PDFs shorter than this are parsed in-process; the pool only pays off for long allocation lists
+CABIN_POOL_MIN_PAGES = int(os.getenv("CABIN_POOL_MIN_PAGES", "4"))
+_cabin_pool = None
+
+
+def cabin_pool() -> ProcessPoolExecutor:
+    """Long-lived worker pool for cabin page extraction, created on first use."""
+    global _cabin_pool
+    if _cabin_pool is None:
+        # spawn, not fork: the server process is multithreaded by the time this runs
+        _cabin_pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 1,
+                                          mp_context=multiprocessing.get_context("spawn"))
+    return _cabin_pool
+
+
+@app.on_event("shutdown")
+def shutdown_cabin_pool():
+    if _cabin_pool is not None:
+        _cabin_pool.shutdown(cancel_futures=True)
+
+
+def extract_cabins(pdf_path: str) -> list:
+    """Extracts cabin rows from every page of the PDF, spreading long PDFs over the worker pool."""
+    with ingest_stage("cabin_pdf_open"):
+        with pdfplumber.open(pdf_path) as pdf_file:
+            page_count = len(pdf_file.pages)
+    if page_count == 0:
+        return []
+    with ingest_stage("cabin_table_extraction"):
+        if page_count < CABIN_POOL_MIN_PAGES:
+            pages = [extract_cabin_page(pdf_path, page_number) for page_number in range(page_count)]
+        else:
+            pages = list(cabin_pool().map(extract_cabin_page, repeat(pdf_path), range(page_count)))
+    # Later pages win when the same faculty shows up twice
+    rows = {}
+    for page in pages:
+        for row in page:
+            rows[row["faculty_key"]] = row
+    return list(rows.values())
+
+
+def load_cabins(rows: list) -> None:
+    """Upserts cabin rows into cabin_db, creating the table and its index if needed."""
+    with ingest_stage("cabin_db_load"), DB_QUERY_SECONDS.time(query="cabin_upsert"):
+        with engine.begin() as connection:
+            for statement in CABIN_DDL:
+                connection.execute(text(statement))
+            if rows:
+                connection.execute(text(cabin_upsert_query), rows)
+
 
 @app.post("/upload-cabins-to-DB")
-def upload_cabin_data(file: UploadFile = File(...)):
+async def upload_cabin_data(file: UploadFile = File(...)):
     try:
         pdf_path = os.path.join(UPLOAD_FOLDER, file.filename)
         with open(pdf_path, "wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
-        with pdfplumber.open(pdf_path) as pdf_file:
-            tables=[]
-            for page in pdf_file.pages:
-                lst=[]
-                table=page.extract_tables()
-                for row in table[0][1:]:
-                    lst.append({"Faculty":row[1],
-                          "cabin":row[-1]})
-                tables.append(pd.DataFrame(lst))
-        df=pd.concat(tables,ignore_index=True)
-        engine = create_engine(DATABASE_URL)
-        with engine.connect() as connection:
-            df.to_sql("cabin_db", con=connection, if_exists='replace', index=False)
+        start = time.perf_counter()
+        rows = await asyncio.to_thread(extract_cabins, pdf_path)
+        extracted = time.perf_counter()
+        await asyncio.to_thread(load_cabins, rows)
+        loaded = time.perf_counter()
+        # Local-snapshot replicas read cabins from the snapshot, so re-export the live version
+        await asyncio.to_thread(refresh_active_snapshot)
         os.remove(pdf_path)
-        return {"message":"upload successfull"}
+        timings = {"extract_seconds": round(extracted - start, 3),
+                   "load_seconds": round(loaded - extracted, 3)}
+        logger.info(f"Cabin upload: {len(rows)} rows, {timings}")
+        return {"message": "upload successfull", "rows": len(rows), "timings": timings}
     except Exception as e:
-        return {"error": e}
+        logger.error(f"Error uploading cabins: {e}")
+        return {"error": str(e)}
 
 
 @app.post("/upload-files-to-s3/")
@@ -106,11 +407,21 @@ async def upload_pdf(folder: str = "", file: UploadFile = File(...)):
     logger.info(f"File uploaded: {file.filename}, saved to {pdf_path}")
 
     # Process and upload extracted pages
-    process_pdf_and_upload(pdf_path, folder)
+    await asyncio.to_thread(process_pdf_and_upload, pdf_path, folder)
     os.remove(f"{UPLOAD_FOLDER}/{file.filename}")
+    await asyncio.to_thread(publish_event, "files_updated", folder=folder)
     return {"message": "Upload successful"}
 
 
+def publish_event(event_type: str, **data):
+    """Notifies the read API instances, which relay the event to their /events subscribers."""
+    try:
+        with engine.begin() as connection:
+            connection.execute(notify_query, notify_params(event_type, **data))
+    except Exception as e:
+        logger.error(f"Error publishing {event_type} event: {e}")
+
+
 def process_pdf_and_upload(pdf_path: str, s3_folder: str):
     """Extracts text, finds patterns, splits into separate PDFs, renames, and uploads."""
 
@@ -185,7 +496,8 @@ def upload_to_s3(file_path: str, s3_key: str):
     bucket_name = os.getenv("AWS_BUCKET_NAME")
     logger.info("inside upload")
     try:
-        s3_client.upload_file(file_path, bucket_name, s3_key)
+        with metrics.external_call("s3", "upload_file"):
+            s3_client.upload_file(file_path, bucket_name, s3_key)
         logger.info(f"Uploaded {file_path} to S3 as {s3_key}")
     except Exception as e:
         logger.error(f"Error uploading {file_path} to S3: {e}")
@@ -0,0 +1,187 @@
+"""
+Benchmarks TimeTableProcessor against the previous merge-based build.
+
+Synthetic Data_extractor output is generated for increasing page counts, both
+implementations are run on it, their runtime and tracemalloc peak are reported,
+and every table they share is checked for equality. The old build left aliased
+rooms ("Comp") without a Room ID in time_table_db; the new one resolves them, so
+the legacy side is given the aliased room when it builds that table. The materialized free-slot
+tables are checked against the anti-joins the read API used to run. Run from the
+repository root:
+
+    python benchmarks/ingest_transform.py --pages 50 200 1000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import ROOM_ALIASES, TimeTableProcessor, inverse_course_mapping  # noqa: E402
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"]
+SLOTS = ["09:00-10:00", "10:00-11:00", "11:00-12:00", "12:00-13:00",
+         "13:00-14:00", "14:00-15:00", "15:00-16:00", "16:00-17:00"]
+
+
+class LegacyTimeTableProcessor:
+    """The pandas implementation TimeTableProcessor replaced, kept here as the reference output."""
+
+    def __init__(self, extracted_data, course_mapping):
+        self.extracted_data = extracted_data
+        self.inverse_course_mapping = course_mapping
+
+    def create_subject_db(self):
+        subject_table = [pd.DataFrame(item["course_details"])[["course code", "Course Name"]] for item in
+                         self.extracted_data]
+        subject_db = pd.concat(subject_table).rename(columns={"Course Name": "Course"}).drop_duplicates().reset_index(
+            drop=True)
+        subject_db["Course Name"] = subject_db["Course"].map(self.inverse_course_mapping)
+        return subject_db
+
+    def create_faculty_db(self):
+        faculty_table = [pd.DataFrame(item["course_details"])["Faculty"] for item in self.extracted_data]
+        faculty_db = pd.DataFrame(pd.Series([j for i in faculty_table for j in i]).unique(), columns=["Faculty"])
+        faculty_db = faculty_db.reset_index().rename(columns={"index": "Faculty_id"})
+        return faculty_db
+
+    def create_faculty_subject_db(self, faculty_db):
+        faculty_subject_table = [pd.DataFrame(item["course_details"])[["course code", "Faculty"]] for item in
+                                 self.extracted_data]
+        df = pd.concat(faculty_subject_table, axis=0)
+        faculty_subject_data = df.merge(faculty_db, on="Faculty")
+        faculty_subject_data = faculty_subject_data.drop_duplicates(subset=["course code", "Faculty"], keep="first")
+        faculty_subject_data = faculty_subject_data.reset_index(drop=True).reset_index().rename(
+            columns={"index": "fs_id"})
+        return faculty_subject_data
+
+    def create_days_db(self):
+        day_table = [pd.DataFrame(item["schedule"])["Day"] for item in self.extracted_data]
+        days_db = pd.DataFrame(pd.concat(day_table, axis=0).unique(), columns=["Day"]).reset_index().rename(
+            columns={"index": "day_id"})
+        return days_db
+
+    def create_slots_db(self):
+        slots_table = [pd.DataFrame(item["schedule"])["Time Slot"] for item in self.extracted_data]
+        slots_db = pd.DataFrame(pd.concat(slots_table, axis=0).unique(), columns=["Time Slot"]).reset_index().rename(
+            columns={"index": "Time_slot_id"})
+        return slots_db
+
+    def create_room_db(self):
+        room_table = [pd.DataFrame(item["schedule"])["Room No"] for item in self.extracted_data]
+        room_db = pd.DataFrame(
+            pd.Series([j for i in room_table for j in i]).replace(ROOM_ALIASES).unique(),
+            columns=["Room No"])
+        room_db = room_db.reset_index().rename(columns={"index": "Room ID"})
+        return room_db
+
+    def create_time_table_db(self, faculty_subject_data, room_db, slots_db, days_db):
+        time_table_data = []
+        for item in self.extracted_data:
+            df = pd.DataFrame(item["schedule"]).merge(faculty_subject_data, on=["course code", 'Faculty'],
+                                                      how="left").drop(columns=["course code", 'Faculty', "Faculty_id"])
+            df = df.replace({"Room No": ROOM_ALIASES}).merge(room_db, on="Room No", how="left").drop(columns=["Room No"])
+            df = df.merge(slots_db, on="Time Slot", how="left").drop(columns=["Time Slot"])
+            df = df.merge(days_db, on="Day", how="left").drop(columns=["Day"])
+            time_table_data.append(df)
+        time_table_db = pd.concat(time_table_data).reset_index(drop=True).reset_index().rename(
+            columns={"index": "Time_table_id"})
+        return time_table_db.drop(columns=['dept'])
+
+    def process_all(self):
+        subject_db = self.create_subject_db()
+        faculty_db = self.create_faculty_db()
+        faculty_subject_db = self.create_faculty_subject_db(faculty_db)
+        days_db = self.create_days_db()
+        slots_db = self.create_slots_db()
+        room_db = self.create_room_db()
+        time_table_db = self.create_time_table_db(faculty_subject_db, room_db, slots_db, days_db)
+        return {
+            "subject_db": subject_db,
+            "faculty_db": faculty_db,
+            "faculty_subject_db": faculty_subject_db,
+            "days_db": days_db,
+            "slots_db": slots_db,
+            "room_db": room_db,
+            "time_table_db": time_table_db
+        }
+
+
+def synthetic_pages(page_count: int, seed: int = 7) -> list:
+    """Generates pages shaped like Data_extractor.extracted (one section timetable per page)."""
+    rng = random.Random(seed)
+    courses = [name for name in inverse_course_mapping if name != "Free"]
+    faculty = [f"Dr. Faculty {i}" for i in range(max(20, page_count // 2))]
+    rooms = [str(100 + i) for i in range(60)] + ["Comp", "CCF 12"]
+    pages = []
+    for page in range(page_count):
+        dept = f"DEPT {page % 12}"
+        details = [{"course code": "Free", "Course Name": "Free", "Faculty": "Free", "dept": dept}]
+        for course in rng.sample(courses, 7):
+            details.append({"course code": f"{inverse_course_mapping[course]}-{rng.randint(1, 40)}",
+                            "Course Name": course, "Faculty": rng.choice(faculty), "dept": dept})
+        schedule = []
+        for day in DAYS:
+            for slot in SLOTS:
+                detail = rng.choice(details)
+                room = "Free" if detail["Course Name"] == "Free" else rng.choice(rooms)
+                schedule.append({"Day": day, "Time Slot": slot, "Room No": room,
+                                 "course code": detail["course code"], "Faculty": detail["Faculty"],
+                                 "dept": dept})
+        pages.append({"course_details": pd.DataFrame(details), "schedule": pd.DataFrame(schedule)})
+    return pages
+
+
+def check_free_slots(tables):
+    """Recomputes faculty/room free slots the way the old read queries did and compares."""
+    all_slots = tables["days_db"].merge(tables["slots_db"], how="cross")
+    facts = (tables["time_table_db"]
+             .merge(tables["faculty_subject_db"][["fs_id", "Faculty"]], on="fs_id")
+             .merge(all_slots, on=["day_id", "Time_slot_id"]))
+    for name, owners, key in (("faculty_free_slots", tables["faculty_db"][["Faculty"]], "Faculty"),
+                              ("room_free_slots", tables["room_db"], "Room ID")):
+        candidates = owners.merge(all_slots, how="cross")
+        busy = facts[[key, "day_id", "Time_slot_id"]].drop_duplicates()
+        expected = candidates.merge(busy, on=[key, "day_id", "Time_slot_id"], how="left", indicator=True)
+        expected = expected[expected["_merge"] == "left_only"]
+        columns = [key, "day_id", "Time_slot_id", "Time Slot"]
+        actual = tables[name][columns].sort_values(columns, ignore_index=True)
+        expected = expected[columns].sort_values(columns, ignore_index=True)
+        pd.testing.assert_frame_equal(actual, expected, check_dtype=False, obj=name)
+
+
+def measure(processor_class, pages, course_mapping):
+    tracemalloc.start()
+    start = time.perf_counter()
+    tables = processor_class(pages, course_mapping).process_all()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return tables, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[20, 100, 500])
+    args = parser.parse_args()
+
+    course_mapping = {v: k for k, v in inverse_course_mapping.items()}
+    print(f"{'pages':>6} {'legacy s':>9} {'new s':>8} {'legacy MiB':>11} {'new MiB':>8}")
+    for page_count in args.pages:
+        pages = synthetic_pages(page_count)
+        expected, legacy_seconds, legacy_peak = measure(LegacyTimeTableProcessor, pages, course_mapping)
+        actual, new_seconds, new_peak = measure(TimeTableProcessor, pages, course_mapping)
+        for name in expected:
+            pd.testing.assert_frame_equal(actual[name], expected[name], obj=name)
+        check_free_slots(actual)
+        print(f"{page_count:>6} {legacy_seconds:>9.3f} {new_seconds:>8.3f} "
+              f"{legacy_peak / 2**20:>11.1f} {new_peak / 2**20:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
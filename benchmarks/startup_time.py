@@ -0,0 +1,65 @@
+"""
+Measures cold-start import time of the API modules.
+
+Each sample runs a fresh interpreter so nothing is cached in-process, which is
+what the free-tier host pays after idling. Run from the repository root:
+
+    python benchmarks/startup_time.py --runs 10
+    API_MODE=read python benchmarks/startup_time.py --module shedule_API
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+"""
+
+
+def sample(module: str) -> float:
+    output = subprocess.run([sys.executable, "-c", PROBE.format(module=module)],
+                            cwd=ROOT, check=True, capture_output=True, text=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def slowest_imports(module: str, top: int) -> list:
+    """Parses `-X importtime` output and returns the module's direct imports by cumulative time."""
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=ROOT, check=True, capture_output=True, text=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Each nesting level adds two spaces of indentation; depth 1 is imported by `module` itself
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            rows.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--module", action="append", help="module to import (repeatable)")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="number of slowest imports to list")
+    args = parser.parse_args()
+
+    for module in args.module or ["shedule_API", "ops_API"]:
+        times = [sample(module) for _ in range(args.runs)]
+        print(f"{module}: median {statistics.median(times):.3f}s  "
+              f"min {min(times):.3f}s  max {max(times):.3f}s  ({args.runs} runs, "
+              f"API_MODE={os.getenv('API_MODE', 'all')})")
+        for seconds, name in slowest_imports(module, args.top):
+            print(f"    {seconds:7.3f}s  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+"""Async SQLAlchemy engine and session factory shared by the read and ops apps."""
+import os
+from dotenv import load_dotenv
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+load_dotenv()
+
+DATABASE_URL = os.environ.get("supabase_uri")
+
+# Create Async SQLAlchemy Engine (statement echo floods the logs under load, so it is opt-in)
+engine = create_async_engine(DATABASE_URL, echo=os.getenv("SQL_ECHO", "false").lower() == "true")
+async_session_factory = sessionmaker(
+    engine, class_=AsyncSession, expire_on_commit=False
+)
+
+
+def asyncpg_dsn() -> str:
+    """DATABASE_URL without the SQLAlchemy driver suffix, for raw asyncpg connections."""
+    return make_url(DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False)
@@ -0,0 +1,116 @@
+"""
+In-process pub/sub behind the `/events` Server-Sent Events stream.
+
+Publishers (circular uploads in ops_API, timetable activation and file uploads in
+admin_api) run `pg_notify` on the shared database, so they work from any process.
+Each read API instance holds one LISTEN connection and fans the notifications out
+to its own subscribers; the event types are documented on shedule_API's /events. Every subscriber gets a bounded queue; when a slow client falls
+behind, its oldest events are dropped instead of letting memory grow.
+"""
+import asyncio
+import json
+import logging
+import os
+from sqlalchemy import text
+
+from metrics import EVENT_SUBSCRIBERS, EVENTS_DROPPED, EVENTS_PUBLISHED
+
+EVENT_CHANNEL = "timetable_events"
+BUFFER_SIZE = int(os.getenv("EVENTS_BUFFER_SIZE", "32"))
+MAX_SUBSCRIBERS = int(os.getenv("EVENTS_MAX_SUBSCRIBERS", "5000"))
+HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", "15"))
+RECONNECT_SECONDS = 5
+
+notify_query = text("SELECT pg_notify(:channel, :payload)")
+
+
+def notify_params(event_type: str, **data) -> dict:
+    """Bind parameters for `notify_query`; NOTIFY payloads must stay under 8000 bytes."""
+    return {"channel": EVENT_CHANNEL, "payload": json.dumps({"type": event_type, **data})}
+
+
+class EventBroker:
+    def __init__(self, buffer_size: int = BUFFER_SIZE, max_subscribers: int = MAX_SUBSCRIBERS):
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers
+        self._subscribers = set()
+        self._hooks = []
+        self._next_id = 0
+
+    @property
+    def full(self) -> bool:
+        return len(self._subscribers) >= self.max_subscribers
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.buffer_size)
+        self._subscribers.add(queue)
+        EVENT_SUBSCRIBERS.set(len(self._subscribers))
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+        EVENT_SUBSCRIBERS.set(len(self._subscribers))
+
+    def add_hook(self, callback):
+        """Registers `callback(event)` to run in-process for every published event."""
+        self._hooks.append(callback)
+
+    def publish(self, event: dict):
+        """Formats the SSE frame once and queues it for every subscriber without blocking."""
+        for callback in self._hooks:
+            callback(event)
+        self._next_id += 1
+        event_type = event.get("type", "message")
+        frame = f"id: {self._next_id}\nevent: {event_type}\ndata: {json.dumps(event)}\n\n"
+        for queue in list(self._subscribers):
+            if queue.full():
+                queue.get_nowait()
+                EVENTS_DROPPED.inc()
+            queue.put_nowait(frame)
+        EVENTS_PUBLISHED.inc(type=event_type)
+
+    async def stream(self, heartbeat_seconds: float = HEARTBEAT_SECONDS):
+        """Async generator of SSE frames for one client, with comment heartbeats when idle."""
+        queue = self.subscribe()
+        try:
+            yield f"retry: {RECONNECT_SECONDS * 1000}\n\n"
+            while True:
+                try:
+                    frame = await asyncio.wait_for(queue.get(), heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+                    continue
+                yield frame
+        finally:
+            # Starlette cancels the generator when the client disconnects
+            self.unsubscribe(queue)
+
+
+async def listen_for_notifications(dsn: str, broker: EventBroker, channel: str = EVENT_CHANNEL):
+    """Keeps a LISTEN connection open and republishes every notification into the broker."""
+    import asyncpg
+
+    def on_notification(connection, pid, channel, payload):
+        try:
+            broker.publish(json.loads(payload))
+        except ValueError:
+            logging.error(f"Ignoring malformed event payload: {payload!r}")
+
+    while True:
+        connection = None
+        try:
+            connection = await asyncpg.connect(dsn)
+            closed = asyncio.Event()
+            connection.add_termination_listener(lambda _: closed.set())
+            await connection.add_listener(channel, on_notification)
+            logging.info(f"Listening for {channel} notifications")
+            await closed.wait()
+            logging.warning("Event listener connection closed, reconnecting")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"Event listener error: {e}")
+        finally:
+            if connection is not None and not connection.is_closed():
+                await connection.close()
+        await asyncio.sleep(RECONNECT_SECONDS)
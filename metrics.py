@@ -0,0 +1,212 @@
+"""
+Small in-process metrics registry exposed in the Prometheus text format.
+
+Both FastAPI apps mount `/metrics` through `install()`; nothing else is needed to
+scrape them. Only the standard library is imported at module load so the helpers
+can also be used from the ingest code in utils.py.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = []
+    for name, value in pairs:
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        escaped.append(f'{name}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+    def collect(self) -> list:
+        lines = super().collect()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][i] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the wall time of the `with` block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def collect(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in self._series.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, series["buckets"]):
+                    cumulative += count
+                    labels = _format_labels(self.labelnames, key, [("le", _format_value(bound))])
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(series['sum'])}")
+                lines.append(f"{self.name}_count{labels} {series['count']}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency (to response headers) by route.",
+    ("app", "method", "route", "status")))
+DB_QUERY_SECONDS = REGISTRY.register(Histogram(
+    "db_query_duration_seconds", "Database query latency by named query.", ("query",)))
+EXTERNAL_CALL_SECONDS = REGISTRY.register(Histogram(
+    "external_call_duration_seconds", "Latency of S3, IMAP and other outbound calls.",
+    ("service", "operation", "outcome")))
+INGEST_STAGE_SECONDS = REGISTRY.register(Histogram(
+    "ingest_stage_duration_seconds", "Time spent in each timetable/cabin ingest stage.", ("stage",)))
+EVENT_SUBSCRIBERS = REGISTRY.register(Gauge(
+    "event_subscribers", "Clients connected to the /events stream."))
+EVENTS_PUBLISHED = REGISTRY.register(Counter(
+    "events_published_total", "Events fanned out to /events subscribers.", ("type",)))
+EVENTS_DROPPED = REGISTRY.register(Counter(
+    "events_dropped_total", "Events discarded because a subscriber's buffer was full."))
+
+
+@contextmanager
+def external_call(service: str, operation: str):
+    """Times an outbound call and records whether it raised."""
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        EXTERNAL_CALL_SECONDS.observe(time.perf_counter() - start,
+                                      service=service, operation=operation, outcome=outcome)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency against the matched route template.
+
+    Latency runs until the response headers are sent, so streaming responses such as
+    /events count their time to first byte rather than the whole connection.
+    """
+
+    def __init__(self, app, app_name: str):
+        self.app = app
+        self.app_name = app_name
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        recorded = False
+
+        def record(status: int):
+            nonlocal recorded
+            recorded = True
+            route = getattr(scope.get("route"), "path", None)
+            if route is None:
+                # Plain Starlette routes (e.g. /metrics) do not set scope["route"]; their paths are fixed
+                route = "unmatched" if status == 404 else scope["path"]
+            REQUEST_SECONDS.observe(time.perf_counter() - start,
+                                    app=self.app_name,
+                                    method=scope["method"],
+                                    route=route,
+                                    status=status)
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start" and not recorded:
+                record(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            if not recorded:
+                record(500)
+
+
+def install(app, app_name: str):
+    """Adds the latency middleware and a `/metrics` endpoint to a FastAPI app."""
+    from starlette.responses import PlainTextResponse
+
+    async def metrics_endpoint(request):
+        return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+    app.add_middleware(MetricsMiddleware, app_name=app_name)
+    app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
@@ -0,0 +1,7 @@
+"""Faculty name normalization shared by cabin ingest and both timetable read paths."""
+import re
+
+
+def normalize_faculty_name(name: str) -> str:
+    # Same rule as the cabin_db lookup in shedule_API: collapse whitespace, trim, lowercase
+    return re.sub(r"\s+", " ", str(name)).strip().lower()
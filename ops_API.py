@@ -0,0 +1,203 @@
+"""
+Operational endpoints: circular ingestion from the mailbox and the Gmail watch.
+
+These are rarely hit, so they live apart from the read path. shedule_API mounts
+this router unless API_MODE=read; `uvicorn ops_API:app` serves them on their own.
+"""
+import os
+import logging
+import asyncio
+import io
+import re
+import email
+from email.header import decode_header
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any
+from fastapi import APIRouter, FastAPI, HTTPException
+from dotenv import load_dotenv
+import metrics
+from database import async_session_factory
+from events import notify_params, notify_query
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+WATCH_REFRESH_SECONDS = 432000  # 5 days, Gmail watches expire after 7
+
+router = APIRouter()
+
+
+def clean_filename(filename):
+    if filename:
+        decoded_filename, encoding = decode_header(filename)[0]
+        if isinstance(decoded_filename, bytes):
+            decoded_filename = decoded_filename.decode(encoding or "utf-8", errors="ignore")
+        decoded_filename = re.sub(r'^[^a-zA-Z]+', '', decoded_filename)
+        return decoded_filename
+    return None
+
+# --- Upload to S3 from memory (streaming) ---
+async def upload_to_s3_streaming(payload_bytes: bytes, s3_key: str, metadata: dict):
+    import aioboto3
+
+    bucket_name = os.getenv("AWS_BUCKET_NAME")
+    session = aioboto3.Session()
+    async with session.client(
+            "s3",
+            aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+            aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+            region_name=os.getenv("AWS_REGION")
+    ) as s3_client:
+        stream = io.BytesIO(payload_bytes)
+        with metrics.external_call("s3", "upload_fileobj"):
+            await s3_client.upload_fileobj(
+                Fileobj=stream,
+                Bucket=bucket_name,
+                Key=s3_key,
+                ExtraArgs={"Metadata": {k.lower(): v for k, v in metadata.items()}}
+            )
+        logging.info(f"✅ Uploaded: {s3_key}")
+
+async def publish_circulars(uploaded: list):
+    """Announces new circulars to /events subscribers (same payload shape as /stream-circulars)."""
+    if not uploaded:
+        return
+    try:
+        async with async_session_factory() as session:
+            for file_info in uploaded:
+                await session.execute(notify_query, notify_params("circular_uploaded", **file_info))
+            await session.commit()
+    except Exception as e:
+        logging.error(f"Error publishing circular events: {e}")
+
+# --- Email Processing Logic ---
+async def process_recent_emails():
+    import imaplib
+
+    with metrics.external_call("imap", "login"):
+        mail = imaplib.IMAP4_SSL(os.getenv('IMAP_SERVER'))
+        mail.login(os.getenv('EMAIL_USER'), os.getenv('EMAIL_PASS'))
+        mail.select("inbox")
+    target=os.getenv('SENDER_EMAIL')
+    with metrics.external_call("imap", "search"):
+        status, email_ids = mail.search(None, f'(UNSEEN FROM "{target}")')
+
+    email_ids = email_ids[0].split() # Last 100 emails
+
+    tasks = []
+    uploaded = []
+
+    for num in reversed(email_ids):
+        email_id = num.decode() if isinstance(num, bytes) else str(num)
+        with metrics.external_call("imap", "fetch"):
+            sstatus, data = mail.fetch(email_id, "(RFC822)")
+        for response_part in data:
+            if isinstance(response_part, tuple):
+                msg = email.message_from_bytes(response_part[1])
+
+                subject, encoding = decode_header(msg["Subject"])[0]
+                if isinstance(subject, bytes):
+                    subject = subject.decode(encoding or "utf-8", errors="ignore")
+                logging.info(f"📩 Processing Email: {subject}")
+
+                for part in msg.walk():
+                    if part.get_content_maintype() != "multipart" and part.get("Content-Disposition"):
+                        filename = clean_filename(part.get_filename())
+                        if not filename:
+                            continue
+
+                        raw_date = msg["Date"]
+                        parsed_date = parsedate_to_datetime(raw_date)
+                        date_str = parsed_date.strftime("%B-%Y-%d")
+                        month_str = parsed_date.strftime("%B")
+
+                        payload = part.get_payload(decode=True)
+                        metadata = {"month": month_str, "date": date_str}
+                        s3_key = f"Circulars/{filename}"
+                        logging.info(s3_key)
+                        tasks.append(upload_to_s3_streaming(payload, s3_key, metadata))
+                        uploaded.append({
+                            "filename": filename,
+                            "url": f"https://{os.getenv('AWS_BUCKET_NAME')}.s3.amazonaws.com/{s3_key}",
+                            "date": date_str,
+                            "month": month_str
+                        })
+        with metrics.external_call("imap", "store"):
+            mail.store(num, '+FLAGS', '\\Seen')
+    await asyncio.gather(*tasks)
+    await publish_circulars(uploaded)
+    return {"status": "✅ All emails processed and uploaded"}
+
+# --- FastAPI Endpoint ---
+@router.post("/upload-emails")
+async def trigger_email_upload():
+    try:
+        result = await process_recent_emails()
+        return {"content": result}
+    except Exception as e:
+        logging.exception("❌ Error processing emails")
+        return {"error": str(e)}
+
+
+@router.get("/watch_inbox")
+async def watch_inbox() -> Dict[str, Any]:
+    """
+    Sets up Gmail API notification watch that will send a signal to Pub/Sub
+    when new emails arrive. Does not include email content in the notification.
+    """
+    try:
+        import google.auth
+        from googleapiclient.discovery import build
+
+        # Now, you can load credentials from the token data
+        creds, _ = google.auth.load_credentials_from_file(r'etc/secrets/token.json')
+
+        service = build('gmail', 'v1', credentials=creds)
+
+        # Set up Gmail Watch to get notifications about new emails
+        watch_request = {
+            'topicName': os.getenv("PUBSUB_TOPIC_NAME"),
+            'labelIds': ['INBOX'],
+            'labelFilterAction': 'include'
+        }
+        # Execute the watch request
+        with metrics.external_call("gmail", "watch"):
+            response = service.users().watch(userId='me', body=watch_request).execute()
+
+        # Return the historyId and expiration from the watch response
+        return {
+            'status': 'success',
+            'message': 'Email notification watch configured successfully',
+            'historyId': response.get('historyId'),
+            'expiration': response.get('expiration')
+        }
+
+    except Exception as error:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                'status': 'error',
+                'message': f'An error occurred: {str(error)}'
+            }
+        )
+
+
+async def refresh_watch(interval_seconds: int):
+    # Renews the Gmail watch in-process when the ops app runs standalone
+    while True:
+        try:
+            await watch_inbox()
+        except Exception as e:
+            logging.error(f"Error renewing Gmail watch: {e}")
+        await asyncio.sleep(interval_seconds)
+
+
+app = FastAPI()
+metrics.install(app, "ops_API")
+app.include_router(router)
+
+
+@app.on_event("startup")
+async def startup_event():
+    asyncio.create_task(refresh_watch(WATCH_REFRESH_SECONDS))
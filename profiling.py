@@ -0,0 +1,95 @@
+"""
+Opt-in cProfile hooks for the timetable ingest pipeline.
+
+Ingest code wraps each stage in `ingest_stage(name, profiler)`. With the default
+NULL_PROFILER nothing is profiled and only the stage metric is recorded; an
+IngestProfiler keeps one cProfile.Profile per stage and writes them to disk
+together with a JSON summary.
+"""
+import cProfile
+import json
+import os
+import pstats
+import time
+from contextlib import contextmanager, nullcontext
+
+from metrics import INGEST_STAGE_SECONDS
+
+PROFILE_DIR = os.getenv("INGEST_PROFILE_DIR", "profiles")
+TOP_FUNCTIONS = 15
+
+
+def profiling_requested(flag: bool = False) -> bool:
+    """Profiling is enabled per request via query flag or globally via INGEST_PROFILE=true."""
+    return flag or os.getenv("INGEST_PROFILE", "false").lower() == "true"
+
+
+class IngestProfiler:
+    def __init__(self, name: str, output_dir: str = PROFILE_DIR):
+        self.name = name
+        self.output_dir = output_dir
+        self._profiles = {}
+        self._seconds = {}
+        self._entries = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        # Stages must not nest: only one cProfile.Profile can be active per thread
+        profile = self._profiles.setdefault(name, cProfile.Profile())
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            self._seconds[name] = self._seconds.get(name, 0.0) + time.perf_counter() - start
+            self._entries[name] = self._entries.get(name, 0) + 1
+
+    def summary(self) -> dict:
+        stages = {}
+        for name, profile in self._profiles.items():
+            stats = pstats.Stats(profile).stats
+            top = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:TOP_FUNCTIONS]
+            stages[name] = {
+                "seconds": round(self._seconds.get(name, 0.0), 4),
+                "entries": self._entries.get(name, 0),
+                "top_functions": [
+                    {"function": f"{filename}:{line}({func})",
+                     "calls": calls,
+                     "total_seconds": round(total, 4),
+                     "cumulative_seconds": round(cumulative, 4)}
+                    for (filename, line, func), (_, calls, total, cumulative, _) in top
+                ],
+            }
+        return {"name": self.name, "stages": stages}
+
+    def save(self) -> dict:
+        """Dumps one .prof file per stage plus summary.json and returns the summary."""
+        run_dir = os.path.join(self.output_dir, self.name)
+        os.makedirs(run_dir, exist_ok=True)
+        summary = self.summary()
+        for name, profile in self._profiles.items():
+            path = os.path.join(run_dir, f"{name}.prof")
+            profile.dump_stats(path)
+            summary["stages"][name]["profile"] = path
+        summary["profile_dir"] = run_dir
+        with open(os.path.join(run_dir, "summary.json"), "w") as file:
+            json.dump(summary, file, indent=2)
+        return summary
+
+
+class _NullProfiler:
+    _stage = nullcontext()
+
+    def stage(self, name: str):
+        return self._stage
+
+
+NULL_PROFILER = _NullProfiler()
+
+
+@contextmanager
+def ingest_stage(name: str, profiler=NULL_PROFILER):
+    """Records the stage metric and, when a profiler is active, profiles the block."""
+    with INGEST_STAGE_SECONDS.time(stage=name), profiler.stage(name):
+        yield
@@ -2,116 +2,224 @@ import os
 import logging
 import asyncio
 from fastapi import FastAPI, Query,Request,HTTPException
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
-import boto3
-import aioboto3
 from sqlalchemy import text
-import aiohttp
 from datetime import datetime
 from random import randint
-import requests
-import imaplib
-import email
-from email.header import decode_header
-from email.utils import parsedate_to_datetime
-import  io
-import re
-from typing import Dict, Any
-import google.auth
-from googleapiclient.discovery import build
+from time import monotonic
+from functools import lru_cache
 import json
+import re
 from fastapi.responses import StreamingResponse
+import metrics
+from metrics import DB_QUERY_SECONDS
+from database import async_session_factory, asyncpg_dsn
+from events import EventBroker, listen_for_notifications
+from versions import LEGACY_SCHEMA, LEGACY_VERSION, VersionCache, active_version_query
+from naming import normalize_faculty_name
+import sqlite_snapshot
+from sqlite_snapshot import SnapshotSync
+
+# boto3, aioboto3, aiohttp and requests are imported inside the handlers that need them so the
+# read path starts fast after the free-tier host idles; see benchmarks/startup_time.py
 
 load_dotenv()
 
-free_room_query=query = """
-        WITH occupied_rooms AS (
-    SELECT 
-        tt."Room ID", 
-        s."Time Slot"
-    FROM "time_table_db" tt
-    JOIN "days_db" d ON tt."day_id" = d."day_id"
-    JOIN "slots_db" s ON tt."Time_slot_id" = s."Time_slot_id"
-    WHERE d."Day" = :day 
-        AND (
-            :time >= SPLIT_PART(s."Time Slot", '-', 1)  
-            AND :time < SPLIT_PART(s."Time Slot", '-', 2)
-        )
+# Both lookups read the free-slot tables materialized by TimeTableProcessor at ingest time.
+# `{schema}` is the active timetable version's schema, filled in by versioned().
+# Those tables only cover faculty in faculty_db and days in days_db; the UNION ALL branches keep the
+# old anti-join answers for the rest (a day without classes, a faculty member without classes).
+free_room_query = """
+SELECT "Room No", "Time Slot"
+FROM "{schema}".room_free_slots
+WHERE "Day" = :day
+  AND start_time <= :time
+  AND :time < end_time
+UNION ALL
+SELECT r."Room No", s."Time Slot"
+FROM "{schema}".room_db r
+CROSS JOIN "{schema}".slots_db s
+WHERE NOT EXISTS (SELECT 1 FROM "{schema}".days_db WHERE "Day" = :day)
+  AND SPLIT_PART(s."Time Slot", '-', 1)::TIME <= :time
+  AND :time < SPLIT_PART(s."Time Slot", '-', 2)::TIME;
+"""
+
+faculty_sql_query = """
+SELECT :faculty_name AS Faculty,
+       c.cabin,
+       f."Time Slot" AS Slot
+FROM (
+    SELECT day_id, "Time Slot", start_time, end_time
+    FROM "{schema}".faculty_free_slots
+    WHERE "Faculty" = :faculty_name
+    UNION ALL
+    SELECT d.day_id, s."Time Slot",
+           SPLIT_PART(s."Time Slot", '-', 1)::TIME, SPLIT_PART(s."Time Slot", '-', 2)::TIME
+    FROM "{schema}".days_db d
+    CROSS JOIN "{schema}".slots_db s
+    WHERE NOT EXISTS (SELECT 1 FROM "{schema}".faculty_db WHERE "Faculty" = :faculty_name)
+) f
+JOIN cabin_db c ON c.faculty_key = LOWER(BTRIM(REGEXP_REPLACE(:faculty_name, '\\s+', ' ', 'g')))  -- Indexed cabin lookup
+WHERE f.day_id > (SELECT day_id FROM "{schema}".days_db WHERE "Day" = :day)
+   OR (
+       f.day_id = (SELECT day_id FROM "{schema}".days_db WHERE "Day" = :day)
+       AND :time ::TIME < f.end_time  -- Slot still running or yet to start
+   )
+ORDER BY f.day_id, f.start_time
+LIMIT 1;
+"""
+
+# Tables loaded before the free-slot tables existed (the legacy `public` schema) still need the
+# per-request days x slots anti-joins
+legacy_free_room_query = """
+WITH occupied_rooms AS (
+    SELECT tt."Room ID", s."Time Slot"
+    FROM "{schema}".time_table_db tt
+    JOIN "{schema}".days_db d ON tt.day_id = d.day_id
+    JOIN "{schema}".slots_db s ON tt."Time_slot_id" = s."Time_slot_id"
+    WHERE d."Day" = :day
+      AND :time >= SPLIT_PART(s."Time Slot", '-', 1)::TIME
+      AND :time < SPLIT_PART(s."Time Slot", '-', 2)::TIME
 )
-SELECT 
-    r."Room No", 
-    s."Time Slot"
-FROM "room_db" r
-JOIN "slots_db" s 
-    ON (
-        :time >= SPLIT_PART(s."Time Slot", '-', 1)  
-        AND :time < SPLIT_PART(s."Time Slot", '-', 2)
-    )
-LEFT JOIN occupied_rooms o 
-    ON r."Room ID" = o."Room ID" 
-    AND s."Time Slot" = o."Time Slot"
+SELECT r."Room No", s."Time Slot"
+FROM "{schema}".room_db r
+JOIN "{schema}".slots_db s
+    ON :time >= SPLIT_PART(s."Time Slot", '-', 1)::TIME
+   AND :time < SPLIT_PART(s."Time Slot", '-', 2)::TIME
+LEFT JOIN occupied_rooms o ON r."Room ID" = o."Room ID" AND s."Time Slot" = o."Time Slot"
 WHERE o."Room ID" IS NULL;
-    """
+"""
 
-faculty_sql_query = """ WITH faculty_schedule AS (
-    SELECT tt.day_id, tt."Time_slot_id", fs."Faculty"  
-    FROM time_table_db tt
-    JOIN faculty_subject_db fs ON tt.fs_id = fs.fs_id
-    WHERE fs."Faculty" = :faculty_name  -- Replace dynamically if needed
-), 
+legacy_faculty_sql_query = """
+WITH faculty_schedule AS (
+    SELECT tt.day_id, tt."Time_slot_id"
+    FROM "{schema}".time_table_db tt
+    JOIN "{schema}".faculty_subject_db fs ON tt.fs_id = fs.fs_id
+    WHERE fs."Faculty" = :faculty_name
+),
 all_slots AS (
-    SELECT d.day_id, 
-           s."Time_slot_id", 
-           s."Time Slot" AS slot_time,  -- Keep full slot format (09:00-10:00)
-           SPLIT_PART(s."Time Slot", '-', 1)::TIME AS start_time,  -- Extract start time
-           SPLIT_PART(s."Time Slot", '-', 2)::TIME AS end_time,  -- Extract end time
-           d."Day"
-    FROM days_db d
-    CROSS JOIN slots_db s
-) 
-SELECT :faculty_name  AS Faculty, 
+    SELECT d.day_id,
+           s."Time_slot_id",
+           s."Time Slot" AS slot_time,
+           SPLIT_PART(s."Time Slot", '-', 1)::TIME AS start_time,
+           SPLIT_PART(s."Time Slot", '-', 2)::TIME AS end_time
+    FROM "{schema}".days_db d
+    CROSS JOIN "{schema}".slots_db s
+)
+SELECT :faculty_name AS Faculty,
        c.cabin,
-       a.slot_time AS Slot -- Keep full time range
+       a.slot_time AS Slot
 FROM all_slots a
-LEFT JOIN faculty_schedule f 
-    ON a.day_id = f.day_id AND a."Time_slot_id" = f."Time_slot_id"
-JOIN cabin_db c ON c."Faculty" = :faculty_name   -- Map faculty to their cabin
+LEFT JOIN faculty_schedule f ON a.day_id = f.day_id AND a."Time_slot_id" = f."Time_slot_id"
+JOIN cabin_db c ON c.faculty_key = LOWER(BTRIM(REGEXP_REPLACE(:faculty_name, '\\s+', ' ', 'g')))
 WHERE f."Time_slot_id" IS NULL
 AND (
-    a.day_id > (SELECT day_id FROM days_db WHERE "Day" = :day)  
+    a.day_id > (SELECT day_id FROM "{schema}".days_db WHERE "Day" = :day)
     OR (
-        a.day_id = (SELECT day_id FROM days_db WHERE "Day" = :day)  
-        AND (:time ::TIME < a.start_time OR :time ::TIME < a.end_time)  -- Compare both start & end
+        a.day_id = (SELECT day_id FROM "{schema}".days_db WHERE "Day" = :day)
+        AND :time ::TIME < a.end_time
     )
-) 
+)
 ORDER BY a.day_id, a.start_time
 LIMIT 1;
-
 """
+
+faculty_list_query = '''SELECT "Faculty" FROM "{schema}".faculty_db ORDER BY REGEXP_REPLACE("Faculty", '^(Dr\\.|Prof\\.|Mr\\.|Ms\\.)\\s*[A-Z]\\.\\s*', '', 'gi');'''
 # Initialize Logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
 API_URL_1= "https://faculty-availability-api.onrender.com/health"
 API_URL_2 = "https://faculty-availability-api.onrender.com/watch_inbox"
-DATABASE_URL = os.environ.get("supabase_uri")
 
-# Create Async SQLAlchemy Engine
-engine = create_async_engine(DATABASE_URL, echo=True)
-async_session_factory = sessionmaker(
-    engine, class_=AsyncSession, expire_on_commit=False
-)
+# Fans circular/timetable notifications out to every connected /events client
+broker = EventBroker()
+
+# The live version is re-read at most every VERSION_TTL_SECONDS, or right after a timetable_updated event
+VERSION_TTL_SECONDS = float(os.getenv("VERSION_TTL_SECONDS", "30"))
+# After a failed lookup the last known version is kept and the registry re-read this soon
+VERSION_RETRY_SECONDS = float(os.getenv("VERSION_RETRY_SECONDS", "2"))
+UNDEFINED_TABLE = "42P01"
+_active = {"version": LEGACY_VERSION, "schema": LEGACY_SCHEMA, "expires": 0.0}
+# Results that only depend on the (immutable) timetable version
+results_cache = VersionCache(int(os.getenv("RESULT_CACHE_SIZE", "2048")))
+
+
+def expire_active_version(event: dict):
+    if event.get("type") == "timetable_updated":
+        _active["expires"] = 0.0
+
+
+broker.add_hook(expire_active_version)
+
+# SNAPSHOT_MODE=local answers timetable queries from the active SQLite snapshot on local disk;
+# until the first download finishes (or if it fails) they go to Postgres as usual
+SNAPSHOT_MODE = os.getenv("SNAPSHOT_MODE", "db").lower()
+snapshot_sync = SnapshotSync()
+FACULTY_TITLE = re.compile(r"^(Dr\.|Prof\.|Mr\.|Ms\.)\s*[A-Z]\.\s*", re.I)
+
+
+def refresh_snapshot(event: dict):
+    if event.get("type") == "snapshot_published":
+        snapshot_sync.request_refresh()
+
+
+if SNAPSHOT_MODE == "local":
+    broker.add_hook(refresh_snapshot)
+
+
+def local_snapshot():
+    """The LocalSnapshot to serve from, or None to query Postgres."""
+    return snapshot_sync.current if SNAPSHOT_MODE == "local" else None
+
+
+async def active_version():
+    """Returns (version, schema) of the timetable currently being served."""
+    if monotonic() < _active["expires"]:
+        return _active["version"], _active["schema"]
+    try:
+        async with async_session_factory() as session:
+            with DB_QUERY_SECONDS.time(query="active_version"):
+                row = (await session.execute(text(active_version_query))).first()
+    except Exception as e:
+        if getattr(getattr(e, "orig", None), "sqlstate", None) != UNDEFINED_TABLE:
+            # Connection errors and timeouts must not flip every instance to the legacy tables
+            logging.warning(f"Could not read active timetable version, keeping {_active['version']}: {e}")
+            _active["expires"] = monotonic() + VERSION_RETRY_SECONDS
+            return _active["version"], _active["schema"]
+        # No version registry yet
+        row = None
+    # Nothing activated yet: keep serving the legacy tables in public
+    version, schema = row if row else (LEGACY_VERSION, LEGACY_SCHEMA)
+    _active.update(version=version, schema=schema, expires=monotonic() + VERSION_TTL_SECONDS)
+    return version, schema
+
+
+@lru_cache(maxsize=None)
+def versioned(query: str, schema: str, legacy_query: str = None):
+    """The statement for `schema`; `legacy_query` replaces `query` for the pre-versioning tables in public."""
+    if legacy_query is not None and schema == LEGACY_SCHEMA:
+        query = legacy_query
+    return text(query.format(schema=schema))
+
+# API_MODE=read serves only the read path; the ops endpoints are then run from ops_API:app
+API_MODE = os.getenv("API_MODE", "all").lower()
 
 app = FastAPI()
+metrics.install(app, "shedule_API")
+if API_MODE != "read":
+    from ops_API import router as ops_router
+    app.include_router(ops_router)
 
 async def keep_alive(api_url: str, interval_seconds: int):
     #Asynchronously pings the API every 11 minutes.
+    import aiohttp
+
     while True:
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(api_url) as response:
-                    logging.info(f"Pinged API: {response.status}")
+            with metrics.external_call("http", "keep_alive"):
+                async with aiohttp.ClientSession() as session:
+                    async with session.get(api_url) as response:
+                        logging.info(f"Pinged API: {response.status}")
         except Exception as e:
             logging.error(f"Error pinging API: {e}")
         await asyncio.sleep(interval_seconds)
@@ -122,25 +230,46 @@ async def startup_event():
     asyncio.create_task(keep_alive(API_URL_1, 660))  # 660 seconds = 11 minutes
 
     # Start the second keep_alive task (every 5 days)
-    asyncio.create_task(keep_alive(API_URL_2, 432000))  # 432000 seconds = 5 days
+    if API_MODE != "read":
+        asyncio.create_task(keep_alive(API_URL_2, 432000))  # 432000 seconds = 5 days
+
+    # Relay Postgres NOTIFY events from the ingest paths into the in-process broker
+    asyncio.create_task(listen_for_notifications(asyncpg_dsn(), broker))
+
+    if SNAPSHOT_MODE == "local":
+        asyncio.create_task(snapshot_sync.run())
+
 @app.get("/health")
 async def health_check():
     return {"status": "keeping live"}
 
 async def execute_query(faculty_name:str, day:str, time:str):
     """Executes the SQL query asynchronously and returns results."""
+    # Not result-cached: cabin_db is updated independently of timetable versions
+    snapshot = local_snapshot()
+    if snapshot:
+        try:
+            params = {"faculty_name": faculty_name, "faculty_key": normalize_faculty_name(faculty_name), "day": day,
+                      "time": datetime.strptime(time, "%H:%M").strftime("%H:%M:%S")}
+            rows = await asyncio.to_thread(snapshot.fetch, "faculty_schedule", sqlite_snapshot.faculty_query, params)
+            if not rows:
+                return "No schedule available."
+            return dict(rows[0])
+        except Exception as e:
+            logging.error(f"Snapshot error: {e}")
+            return "Error retrieving schedule."
+    _, schema = await active_version()
     async with async_session_factory() as session:
         try:
             parsed_time = datetime.strptime(time, "%H:%M").time()
-            result = await session.execute(
-                text(faculty_sql_query), {"faculty_name": faculty_name, "day": day, "time": parsed_time}
-            )
-            rows = result.fetchall()
-            logging.info(f"rows fetched : {rows}")
+            with DB_QUERY_SECONDS.time(query="faculty_schedule"):
+                result = await session.execute(
+                    versioned(faculty_sql_query, schema, legacy_faculty_sql_query), {"faculty_name": faculty_name, "day": day, "time": parsed_time}
+                )
+                rows = result.fetchall()
             if not rows:
                 return "No schedule available."
             output = [dict(row._mapping) for row in rows]
-            logging.info(f"results : {output[0]}")
             return output[0]
         except Exception as e:
             logging.error(f"Database error: {e}")
@@ -154,14 +283,29 @@ async def get_faculty_schedule(faculty_name: str=Query(..., description="Enter f
 
 @app.get("/faculty_list")
 async def faculty_list():
-    async with async_session_factory() as session:
-        result = await session.execute(
-            text('''SELECT "Faculty" FROM faculty_db ORDER BY REGEXP_REPLACE("Faculty", '^(Dr\\.|Prof\\.|Mr\\.|Ms\\.)\\s*[A-Z]\\.\\s*', '', 'gi');''')
-        )
-        rows = result.fetchall()
-    return [row[0] for row in rows]
+    snapshot = local_snapshot()
+    if snapshot:
+        faculty = results_cache.get(snapshot.cache_key, ("faculty_list",))
+        if faculty is None:
+            rows = await asyncio.to_thread(snapshot.fetch, "faculty_list", sqlite_snapshot.faculty_list_query, {})
+            # Same ordering as faculty_list_query: by name with the title and initial stripped
+            faculty = sorted((row[0] for row in rows), key=lambda name: FACULTY_TITLE.sub("", name))
+            results_cache.put(snapshot.cache_key, ("faculty_list",), faculty)
+        return faculty
+    version, schema = await active_version()
+    faculty = results_cache.get(version, ("faculty_list",))
+    if faculty is None:
+        async with async_session_factory() as session:
+            with DB_QUERY_SECONDS.time(query="faculty_list"):
+                result = await session.execute(versioned(faculty_list_query, schema))
+                rows = result.fetchall()
+        faculty = [row[0] for row in rows]
+        results_cache.put(version, ("faculty_list",), faculty)
+    return faculty
 
 async def get_s3_client():
+    import boto3
+
     return boto3.client(
         "s3",
         aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
@@ -171,20 +315,24 @@ async def get_s3_client():
 
 @app.get("/list-objects/")
 async def list_objects(folder: str =Query(...,description="Enter the folder available in S3 bucket")):
+    import requests
+
     s3_client = await get_s3_client()
     bucket_name = os.getenv("AWS_BUCKET_NAME")
     region=os.getenv("AWS_REGION")
 
     try:
         if folder == "Forms":
-            response = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=folder)
+            with metrics.external_call("s3", "list_objects"):
+                response = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=folder)
             files = []
             for obj in response.get("Contents", [])[1:]:  # Skipping the first object (if needed)
                 file_name = obj["Key"].split("/")[-1]  # Extract filename
                 s3_url = f"https://{bucket_name}.s3.{region}.amazonaws.com/{obj['Key']}"  # Full S3 URL
 
                 # Get shortened URL from TinyURL
-                short_url = requests.get(f"http://tinyurl.com/api-create.php?url={s3_url}").text
+                with metrics.external_call("tinyurl", "shorten"):
+                    short_url = requests.get(f"http://tinyurl.com/api-create.php?url={s3_url}").text
 
                 # Store the result
                 files.append({
@@ -194,7 +342,8 @@ async def list_objects(folder: str =Query(...,description="Enter the folder avai
                 print(short_url)
 
         else:
-            response = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=folder)
+            with metrics.external_call("s3", "list_objects"):
+                response = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=folder)
             files = [
                 {
                     "file_name": obj["Key"].split("/")[-1] ,# Ensures correct filename extraction
@@ -210,10 +359,35 @@ async def list_objects(folder: str =Query(...,description="Enter the folder avai
 @app.get("/empty-rooms/")
 async def find_empty_rooms(day: str=Query(...,description="Enter the name of weekday on which you want to find empty room"),
                          time: str=Query(...,description="Enter the time of when you need an empty room")):
-    async with async_session_factory() as session:
-        result = await session.execute(text(free_room_query), {"day": day, "time": time})
-        free_rooms = [dict(row._mapping) for row in result.fetchall() if "&" not in row[0]]
-        room=randint(0,len(free_rooms)-1)
+    try:
+        parsed_time = datetime.strptime(time, "%H:%M").time()
+    except ValueError:
+        raise HTTPException(status_code=422, detail="time must be in HH:MM format")
+    snapshot = local_snapshot()
+    try:
+        if snapshot:
+            free_rooms = results_cache.get(snapshot.cache_key, ("free_rooms", day, parsed_time))
+            if free_rooms is None:
+                rows = await asyncio.to_thread(snapshot.fetch, "free_rooms", sqlite_snapshot.free_room_query,
+                                               {"day": day, "time": parsed_time.strftime("%H:%M:%S")})
+                free_rooms = [dict(row) for row in rows if "&" not in row[0]]
+                results_cache.put(snapshot.cache_key, ("free_rooms", day, parsed_time), free_rooms)
+        else:
+            version, schema = await active_version()
+            free_rooms = results_cache.get(version, ("free_rooms", day, parsed_time))
+            if free_rooms is None:
+                async with async_session_factory() as session:
+                    with DB_QUERY_SECONDS.time(query="free_rooms"):
+                        result = await session.execute(versioned(free_room_query, schema, legacy_free_room_query),
+                                                       {"day": day, "time": parsed_time})
+                    free_rooms = [dict(row._mapping) for row in result.fetchall() if "&" not in row[0]]
+                results_cache.put(version, ("free_rooms", day, parsed_time), free_rooms)
+    except Exception as e:
+        logging.error(f"Database error: {e}")
+        return "Error retrieving free rooms."
+    if not free_rooms:
+        return {"day": day, "time": time, "free_room": None}
+    room=randint(0,len(free_rooms)-1)
     return {"day": day, "time": free_rooms[room]["Time Slot"], "free_room": free_rooms[room]["Room No"]}
 
 
@@ -223,108 +397,31 @@ async def generate_temp_url(
         object_key: str = Query(..., description="Key (file path) of the S3 object")
 
 ):
+    import requests
+
     bucket_name=os.getenv("AWS_BUCKET_NAME")
     s3_client = await get_s3_client()
     try:
-        url = s3_client.generate_presigned_url(
-            "get_object",
-            Params={"Bucket": bucket_name, "Key": object_key},
-            ExpiresIn=300
-        )
+        with metrics.external_call("s3", "presign"):
+            url = s3_client.generate_presigned_url(
+                "get_object",
+                Params={"Bucket": bucket_name, "Key": object_key},
+                ExpiresIn=300
+            )
 
         file_name = object_key.split("/")[-1]
-        short_url=requests.get(f"http://tinyurl.com/api-create.php?url={url}").text
+        with metrics.external_call("tinyurl", "shorten"):
+            short_url=requests.get(f"http://tinyurl.com/api-create.php?url={url}").text
 # Extract file name from path
         print(short_url)
         return {"file_name": file_name, "presigned_url": short_url}
     except Exception as e:
         logging.error(f"Error generating pre-signed URL: {e}")
         return {"error": str(e)}
-def clean_filename(filename):
-    if filename:
-        decoded_filename, encoding = decode_header(filename)[0]
-        if isinstance(decoded_filename, bytes):
-            decoded_filename = decoded_filename.decode(encoding or "utf-8", errors="ignore")
-        decoded_filename = re.sub(r'^[^a-zA-Z]+', '', decoded_filename)
-        return decoded_filename
-    return None
-
-# --- Upload to S3 from memory (streaming) ---
-async def upload_to_s3_streaming(payload_bytes: bytes, s3_key: str, metadata: dict):
-    bucket_name = os.getenv("AWS_BUCKET_NAME")
-    session = aioboto3.Session()
-    async with session.client(
-            "s3",
-            aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-            aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-            region_name=os.getenv("AWS_REGION")
-    ) as s3_client:
-        stream = io.BytesIO(payload_bytes)
-        await s3_client.upload_fileobj(
-            Fileobj=stream,
-            Bucket=bucket_name,
-            Key=s3_key,
-            ExtraArgs={"Metadata": {k.lower(): v for k, v in metadata.items()}}
-        )
-        logging.info(f"✅ Uploaded: {s3_key}")
-
-# --- Email Processing Logic ---
-async def process_recent_emails():
-    mail = imaplib.IMAP4_SSL(os.getenv('IMAP_SERVER'))
-    mail.login(os.getenv('EMAIL_USER'), os.getenv('EMAIL_PASS'))
-    mail.select("inbox")
-    target=os.getenv('SENDER_EMAIL')
-    status, email_ids = mail.search(None, f'(UNSEEN FROM "{target}")')
-
-    email_ids = email_ids[0].split() # Last 100 emails
-
-    tasks = []
-
-    for num in reversed(email_ids):
-        email_id = num.decode() if isinstance(num, bytes) else str(num)
-        sstatus, data = mail.fetch(email_id, "(RFC822)")
-        for response_part in data:
-            if isinstance(response_part, tuple):
-                msg = email.message_from_bytes(response_part[1])
-
-                subject, encoding = decode_header(msg["Subject"])[0]
-                if isinstance(subject, bytes):
-                    subject = subject.decode(encoding or "utf-8", errors="ignore")
-                logging.info(f"📩 Processing Email: {subject}")
-
-                for part in msg.walk():
-                    if part.get_content_maintype() != "multipart" and part.get("Content-Disposition"):
-                        filename = clean_filename(part.get_filename())
-                        if not filename:
-                            continue
-
-                        raw_date = msg["Date"]
-                        parsed_date = parsedate_to_datetime(raw_date)
-                        date_str = parsed_date.strftime("%B-%Y-%d")
-                        month_str = parsed_date.strftime("%B")
-
-                        payload = part.get_payload(decode=True)
-                        metadata = {"month": month_str, "date": date_str}
-                        s3_key = f"Circulars/{filename}"
-                        logging.info(s3_key)
-                        tasks.append(upload_to_s3_streaming(payload, s3_key, metadata))
-        mail.store(num, '+FLAGS', '\\Seen')
-    await asyncio.gather(*tasks)
-    return {"status": "✅ All emails processed and uploaded"}
-
-# --- FastAPI Endpoint ---
-@app.post("/upload-emails")
-async def trigger_email_upload():
-    try:
-        result = await process_recent_emails()
-        return {"content": result}
-    except Exception as e:
-        logging.exception("❌ Error processing emails")
-        return {"error": str(e)}
-
-
 async def generate_s3_file_info():
     """Generate streaming data of S3 file information"""
+    import aioboto3
+
     session = aioboto3.Session()
     bucket_name = os.getenv("AWS_BUCKET_NAME")
 
@@ -334,7 +431,8 @@ async def generate_s3_file_info():
             aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
             region_name=os.getenv("AWS_REGION")
     ) as s3_client:
-        response = await s3_client.list_objects_v2(Bucket=bucket_name, Prefix="Circulars")
+        with metrics.external_call("s3", "list_objects"):
+            response = await s3_client.list_objects_v2(Bucket=bucket_name, Prefix="Circulars")
 
         if 'Contents' not in response:
             yield json.dumps({"message": "No files found in Circulars/"}) + "\n"
@@ -345,7 +443,8 @@ async def generate_s3_file_info():
             if key.endswith('/'):
                 continue
 
-            head = await s3_client.head_object(Bucket=bucket_name, Key=key)
+            with metrics.external_call("s3", "head_object"):
+                head = await s3_client.head_object(Bucket=bucket_name, Key=key)
             metadata = head.get('Metadata', {})
 
             filename = key.split('/')[-1]
@@ -362,48 +461,32 @@ async def generate_s3_file_info():
             await asyncio.sleep(0.1)  # Small delay to avoid overwhelming clients
 
 
-@app.get("/watch_inbox")
-async def watch_inbox() -> Dict[str, Any]:
-    """
-    Sets up Gmail API notification watch that will send a signal to Pub/Sub
-    when new emails arrive. Does not include email content in the notification.
-    """
-    try:
-
-        # Now, you can load credentials from the token data
-        creds, _ = google.auth.load_credentials_from_file(r'etc/secrets/token.json')
-
-        service = build('gmail', 'v1', credentials=creds)
-
-        # Set up Gmail Watch to get notifications about new emails
-        watch_request = {
-            'topicName': os.getenv("PUBSUB_TOPIC_NAME"),
-            'labelIds': ['INBOX'],
-            'labelFilterAction': 'include'
-        }
-        # Execute the watch request
-        response = service.users().watch(userId='me', body=watch_request).execute()
-
-        # Return the historyId and expiration from the watch response
-        return {
-            'status': 'success',
-            'message': 'Email notification watch configured successfully',
-            'historyId': response.get('historyId'),
-            'expiration': response.get('expiration')
-        }
-
-    except Exception as error:
-        raise HTTPException(
-            status_code=400,
-            detail={
-                'status': 'error',
-                'message': f'An error occurred: {str(error)}'
-            }
-        )
 @app.get("/stream-circulars")
 async def stream_circulars(request: Request):
     # Get the user agent to detect client type
    return StreamingResponse(
         generate_s3_file_info(),
         media_type="text/event-stream"  # Using newline-delimited JSON format
-    )
\ No newline at end of file
+    )
+
+
+@app.get("/events")
+async def stream_events():
+    """
+    Server-Sent Events channel, so clients no longer need to poll /stream-circulars or /list-objects/.
+
+    Event types (`data` is the JSON payload):
+    - `circular_uploaded`: filename, url, date, month of a new circular (as in /stream-circulars).
+    - `timetable_updated`: version, schema. The live timetable changed: an upload was activated or
+      /activate-version/ switched or rolled back. Staged and validation-blocked uploads send nothing.
+    - `files_updated`: folder. New files were uploaded to that S3 folder (see /list-objects/).
+    - `snapshot_published`: version. A new SQLite snapshot is available; used by SNAPSHOT_MODE=local
+      instances, clients can ignore it.
+    """
+    if broker.full:
+        raise HTTPException(status_code=503, detail="Too many event subscribers, retry later")
+    return StreamingResponse(
+        broker.stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
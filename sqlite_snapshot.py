@@ -0,0 +1,217 @@
+"""
+SQLite exports of timetable versions, so read replicas can serve without Postgres.
+
+Whenever the live data changes (a version is activated or cabin_db is reloaded),
+admin_api writes the active version to `Snapshots/<version>.sqlite` in S3 and,
+once that upload succeeded, rewrites `Snapshots/active.json` to point at it. With SNAPSHOT_MODE=local, shedule_API keeps the active file on
+local disk (SnapshotSync) and answers timetable queries from it through
+read-only, memory-mapped SQLite connections.
+
+A snapshot also carries a copy of cabin_db, which admin_api re-exports after
+cabin uploads, so faculty lookups need nothing from Postgres.
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+from datetime import datetime, timezone
+
+import metrics
+from metrics import DB_QUERY_SECONDS
+
+SNAPSHOT_PREFIX = "Snapshots"
+MANIFEST_KEY = f"{SNAPSHOT_PREFIX}/active.json"
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")
+SNAPSHOT_POLL_SECONDS = float(os.getenv("SNAPSHOT_POLL_SECONDS", "300"))
+MMAP_BYTES = 256 * 1024 * 1024
+
+# Tables produced by TimeTableProcessor.process_all, i.e. the contents of one timetable version
+TIMETABLE_TABLES = ("subject_db", "faculty_db", "faculty_subject_db", "days_db", "slots_db", "room_db",
+                    "time_table_db", "faculty_free_slots", "room_free_slots")
+TIME_COLUMNS = ("start_time", "end_time")
+
+SQLITE_INDEXES = [
+    '''CREATE INDEX faculty_free_slots_lookup_idx ON faculty_free_slots ("Faculty", day_id, start_time)''',
+    '''CREATE INDEX room_free_slots_lookup_idx ON room_free_slots ("Day", start_time, end_time)''',
+    '''CREATE UNIQUE INDEX days_db_day_idx ON days_db ("Day")''',
+    '''CREATE UNIQUE INDEX cabin_db_faculty_key_idx ON cabin_db (faculty_key)''',
+]
+
+# Slot bounds as zero-padded HH:MM:SS text, for the days_db x slots_db fallbacks below
+SLOT_START = """substr(s."Time Slot", 1, instr(s."Time Slot", '-') - 1) || ':00'"""
+SLOT_END = """substr(s."Time Slot", instr(s."Time Slot", '-') + 1) || ':00'"""
+
+# SQLite keeps alias case, so aliases are lowercase to match what Postgres returns.
+# As in shedule_API, the UNION ALL branches cover faculty without classes and days without classes.
+faculty_query = f"""
+SELECT :faculty_name AS faculty,
+       c.cabin AS cabin,
+       f."Time Slot" AS slot
+FROM (
+    SELECT day_id, "Time Slot", start_time, end_time
+    FROM faculty_free_slots
+    WHERE "Faculty" = :faculty_name
+    UNION ALL
+    SELECT d.day_id, s."Time Slot", {SLOT_START}, {SLOT_END}
+    FROM days_db d
+    CROSS JOIN slots_db s
+    WHERE NOT EXISTS (SELECT 1 FROM faculty_db WHERE "Faculty" = :faculty_name)
+) f
+JOIN cabin_db c ON c.faculty_key = :faculty_key
+WHERE f.day_id > (SELECT day_id FROM days_db WHERE "Day" = :day)
+   OR (
+       f.day_id = (SELECT day_id FROM days_db WHERE "Day" = :day)
+       AND :time < f.end_time
+   )
+ORDER BY f.day_id, f.start_time
+LIMIT 1
+"""
+
+free_room_query = f"""
+SELECT "Room No", "Time Slot"
+FROM room_free_slots
+WHERE "Day" = :day
+  AND start_time <= :time
+  AND :time < end_time
+UNION ALL
+SELECT r."Room No", s."Time Slot"
+FROM room_db r
+CROSS JOIN slots_db s
+WHERE NOT EXISTS (SELECT 1 FROM days_db WHERE "Day" = :day)
+  AND {SLOT_START} <= :time
+  AND :time < {SLOT_END}
+"""
+
+faculty_list_query = '''SELECT "Faculty" FROM faculty_db'''
+
+
+def snapshot_key(version: str) -> str:
+    return f"{SNAPSHOT_PREFIX}/{version}.sqlite"
+
+
+def manifest_body(version: str) -> str:
+    """Contents of active.json; exported_at changes on every export so replicas notice re-exports."""
+    return json.dumps({"version": version,
+                       "key": snapshot_key(version),
+                       "exported_at": datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")})
+
+
+def format_time(value) -> str:
+    """TIME values are stored as zero-padded HH:MM:SS text so they compare correctly as strings."""
+    return value.strftime("%H:%M:%S")
+
+
+def write_sqlite(frames: dict, path: str):
+    """Writes the timetable DataFrames (plus cabin_db) into a fresh, indexed SQLite file."""
+    if os.path.exists(path):
+        os.remove(path)
+    connection = sqlite3.connect(path)
+    try:
+        connection.execute("PRAGMA journal_mode = OFF")
+        for name, df in frames.items():
+            time_columns = [column for column in TIME_COLUMNS if column in df.columns]
+            if time_columns:
+                df = df.assign(**{column: df[column].map(format_time) for column in time_columns})
+            df.to_sql(name, connection, index=False)
+        for statement in SQLITE_INDEXES:
+            connection.execute(statement)
+        connection.commit()
+        connection.execute("VACUUM")
+    finally:
+        connection.close()
+
+
+class LocalSnapshot:
+    def __init__(self, path: str, version: str, exported_at: str):
+        self.path = path
+        self.version = version
+        self.exported_at = exported_at
+
+    @property
+    def cache_key(self) -> str:
+        # Cabin re-exports keep the version but change exported_at
+        return f"{self.version}@{self.exported_at}"
+
+    def fetch(self, query_name: str, query: str, params: dict) -> list:
+        """Runs a read query on a read-only, memory-mapped connection (call from a worker thread)."""
+        with DB_QUERY_SECONDS.time(query=f"local_{query_name}"):
+            # Snapshot files are never modified in place, so immutable=1 skips locking
+            connection = sqlite3.connect(f"file:{self.path}?mode=ro&immutable=1", uri=True)
+            try:
+                connection.row_factory = sqlite3.Row
+                connection.execute(f"PRAGMA mmap_size = {MMAP_BYTES}")
+                return connection.execute(query, params).fetchall()
+            finally:
+                connection.close()
+
+
+class SnapshotSync:
+    """Keeps the manifest's snapshot on local disk, checking S3 on a timer or when asked to."""
+
+    def __init__(self, directory: str = SNAPSHOT_DIR, poll_seconds: float = SNAPSHOT_POLL_SECONDS):
+        self.directory = directory
+        self.poll_seconds = poll_seconds
+        self.current = None
+        # Replaced snapshot, kept on disk until the next swap so handlers that picked it up just
+        # before a swap can still open it
+        self._previous = None
+        self._wake = asyncio.Event()
+
+    def request_refresh(self):
+        self._wake.set()
+
+    async def run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                # Keep serving the snapshot already on disk
+                logging.error(f"Snapshot refresh failed: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def refresh(self):
+        manifest = await asyncio.to_thread(self._read_manifest)
+        current = self.current
+        if current and (current.version, current.exported_at) == (manifest["version"], manifest["exported_at"]):
+            return
+        path = await asyncio.to_thread(self._download, manifest)
+        self.current = LocalSnapshot(path, manifest["version"], manifest["exported_at"])
+        logging.info(f"Serving timetable snapshot {self.current.cache_key}")
+        retired, self._previous = self._previous, current
+        if retired and retired.path not in (path, current.path):
+            try:
+                os.remove(retired.path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _s3_client():
+        import boto3
+
+        return boto3.client(
+            "s3",
+            aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+            aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+            region_name=os.getenv("AWS_REGION"),
+        )
+
+    def _read_manifest(self) -> dict:
+        with metrics.external_call("s3", "get_snapshot_manifest"):
+            response = self._s3_client().get_object(Bucket=os.getenv("AWS_BUCKET_NAME"), Key=MANIFEST_KEY)
+            return json.loads(response["Body"].read())
+
+    def _download(self, manifest: dict) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{manifest['version']}-{manifest['exported_at']}.sqlite")
+        if not os.path.exists(path):
+            partial = f"{path}.part"
+            with metrics.external_call("s3", "download_snapshot"):
+                self._s3_client().download_file(os.getenv("AWS_BUCKET_NAME"), manifest["key"], partial)
+            os.replace(partial, path)
+        return path
+
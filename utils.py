@@ -4,6 +4,10 @@ import pandas as pd
 import numpy as np
 import pdfplumber as reader
 import logging
+import datetime
+from array import array
+from profiling import NULL_PROFILER, ingest_stage
+from naming import normalize_faculty_name
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -26,29 +30,62 @@ inverse_course_mapping={'Statistics for Engineers': 'Statis',
  'Design Project I':'EXSEL',
  'Ethical Hacking & Penetration Testing':'EHPT',
  'Free':'Free'}
+# Room labels rewritten in room_db
+ROOM_ALIASES = {"Comp": "Computer block"}
+
+
+def extract_cabin_page(path: str, page_number: int) -> list:
+    """Extracts faculty/cabin rows from a single page of the cabin allocation PDF."""
+    # Only the requested page is parsed so pages can be extracted in separate processes
+    with reader.open(path, pages=[page_number + 1]) as pdf:
+        tables = pdf.pages[0].extract_tables()
+    rows = []
+    if not tables:
+        return rows
+    for row in tables[0][1:]:
+        if not row[1]:
+            continue
+        faculty = row[1].replace("\n", " ").strip()
+        rows.append({"Faculty": faculty,
+                     "cabin": row[-1],
+                     "faculty_key": normalize_faculty_name(faculty)})
+    return rows
 
 
 class Data_extractor:
-    def compatibility(self, page) -> int:
+    def compatibility(self, tables) -> int:
         global length
-        d = page.extract_tables()
-        length = len(d) - 1
+        length = len(tables) - 1
         return length
 
-    def __init__(self, path: str, inverse_course_mapping):
+    def __init__(self, path: str, inverse_course_mapping, profiler=NULL_PROFILER):
         self.path = path
         self.extracted = []
+        self.profiler = profiler
+        # Cells and courses the parsers could not use, reported by validation.validate_timetable
+        self.page_number = None
+        self.dropped_cells = []
+        self.unmapped_courses = []
         self.process()
         self.mapping = inverse_course_mapping
 
     def process(self) :
-        with reader.open(r"{}".format(self.path)) as pdf:
+        with ingest_stage("pdf_open", self.profiler):
+            pdf = reader.open(r"{}".format(self.path))
+            pages = pdf.pages
+        with pdf:
             i = 0
-            for page in pdf.pages:
-                if self.compatibility(page) > 0:
+            for page in pages:
+                # Tables and text are pulled once per page and shared by the parsers below
+                with ingest_stage("table_extraction", self.profiler):
+                    tables = page.extract_tables()
+                    text = page.extract_text()
+                if self.compatibility(tables) > 0:
+                    self.page_number = page.page_number
                     # class_details=self.get_coordinator(page)
-                    courses_details = self.get_course_details(page)
-                    schedule = self.get_schedule(page, courses_details)
+                    with ingest_stage("page_parse", self.profiler):
+                        courses_details = self.get_course_details(tables, text)
+                        schedule = self.get_schedule(tables, courses_details)
                     i += 1
                     print(i)
                     self.extracted.append({
@@ -109,9 +146,8 @@ class Data_extractor:
 
     # Apply function to the 'Time Slot' column
 
-    def get_schedule(self, page, courses) -> dict:
+    def get_schedule(self, tables, courses) -> dict:
         # Convert to Pandas DataFrame
-        tables = page.extract_tables()
         time_table = pd.DataFrame(tables[length - 1]).replace(["", "None", "---", "-x-"], np.nan).dropna(how="all")
         time_table = time_table.replace([np.nan], "Free")
         free_counts_col = (time_table == "Free").sum()
@@ -152,11 +188,23 @@ class Data_extractor:
                 for i in range(1, len(row)):
                     course, room = self.extract_course_room(row[i])  # Extract course and room number
                     if course:  # Only add valid entries
-                        processed_data.append([day, time_slots[i - 1], course, room])  # Assign correct time slot
-        final_df = pd.DataFrame(processed_data, columns=["Day", "Time Slot", "Course Name", "Room No"])
+                        processed_data.append([day, time_slots[i - 1], course, room, row[i]])  # Assign correct time slot
+        final_df = pd.DataFrame(processed_data, columns=["Day", "Time Slot", "Course Name", "Room No", "cell"])
         course_details = pd.DataFrame(courses)
-        course_details["Course Name"] = course_details["Course Name"].map(inverse_course_mapping)
-        final_df = final_df.merge(course_details, on="Course Name", how="inner")
+        mapped = course_details["Course Name"].map(inverse_course_mapping)
+        unmapped = course_details.loc[mapped.isna(), ["course code", "Course Name", "Faculty"]]
+        self.unmapped_courses.extend(unmapped.rename(columns={"Course Name": "Course"})
+                                     .assign(page=self.page_number).to_dict("records"))
+        course_details["Course Name"] = mapped
+        # The inner merge drops cells whose course is missing from the (mapped) course table; cells it
+        # keeps without a room number are stored with a "Free" room. Each cell is reported once.
+        matched = final_df["Course Name"].isin(course_details["Course Name"])
+        no_room = matched & (final_df["Room No"] == "Free") & (final_df["Course Name"] != "Free")
+        dropped = final_df.loc[~matched | no_room, ["Day", "Time Slot", "cell"]]
+        self.dropped_cells.extend(dropped.assign(page=self.page_number,
+                                                 reason=np.where(no_room[dropped.index], "no_room_number",
+                                                                 "unmatched_course")).to_dict("records"))
+        final_df = final_df.drop(columns=["cell"]).merge(course_details, on="Course Name", how="inner")
         final_df.drop(columns=["Course Name"], inplace=True)
         final_df["Time Slot"] = final_df["Time Slot"].apply(self.convert_to_24hr)
         return final_df
@@ -179,10 +227,8 @@ class Data_extractor:
             }
         return incharge_details
 
-    def get_course_details(self, page) -> dict:
-        course_table = page.extract_tables()
-        course_table = pd.DataFrame(course_table[length])
-        text = page.extract_text()
+    def get_course_details(self, tables, text) -> dict:
+        course_table = pd.DataFrame(tables[length])
         match = re.search(r"DEPARTMENT OF ([A-Z\s]+)\nEVEN SEMESTER", text)
         dept = None
         if match:
@@ -203,82 +249,98 @@ class Data_extractor:
 
 
 class TimeTableProcessor:
-    def __init__(self, extracted_data, course_mapping):
+    """Builds the normalized timetable tables from Data_extractor output in a single pass.
+
+    Dimension values (faculty, course pairs, days, slots, rooms) are interned into dictionaries
+    while pages stream by, and fact rows are kept as compact integer id columns. DataFrames are
+    only created at the end for `to_sql`; the tables match the previous merge-based build.
+    """
+
+    def __init__(self, extracted_data, course_mapping, profiler=NULL_PROFILER):
         self.extracted_data = extracted_data
         self.inverse_course_mapping = course_mapping
+        self.profiler = profiler
 
     def create_section_db(self):
         section_db = pd.DataFrame([item["class_details"] for item in self.extracted_data])
         section_db = section_db[["section", "slot"]].reset_index().rename(columns={"index": "Section_id"})
         return section_db
 
-    def create_subject_db(self):
-        subject_table = [pd.DataFrame(item["course_details"])[["course code", "Course Name"]] for item in
-                         self.extracted_data]
-        subject_db = pd.concat(subject_table).rename(columns={"Course Name": "Course"}).drop_duplicates().reset_index(
-            drop=True)
-        subject_db["Course Name"] = subject_db["Course"].map(self.inverse_course_mapping)
-        return subject_db
-
-    def create_faculty_db(self):
-        faculty_table = [pd.DataFrame(item["course_details"])["Faculty"] for item in self.extracted_data]
-        faculty_db = pd.DataFrame(pd.Series([j for i in faculty_table for j in i]).unique(), columns=["Faculty"])
-        faculty_db = faculty_db.reset_index().rename(columns={"index": "Faculty_id"})
-        return faculty_db
-
-    def create_faculty_subject_db(self, faculty_db):
-        faculty_subject_table = [pd.DataFrame(item["course_details"])[["course code", "Faculty"]] for item in
-                                 self.extracted_data]
-        df = pd.concat(faculty_subject_table, axis=0)
-        faculty_subject_data = df.merge(faculty_db, on="Faculty")
-        faculty_subject_data = faculty_subject_data.drop_duplicates(subset=["course code", "Faculty"], keep="first")
-        faculty_subject_data = faculty_subject_data.reset_index(drop=True).reset_index().rename(
-            columns={"index": "fs_id"})
-        return faculty_subject_data
-
-    def create_days_db(self):
-        day_table = [pd.DataFrame(item["schedule"])["Day"] for item in self.extracted_data]
-        days_db = pd.DataFrame(pd.concat(day_table, axis=0).unique(), columns=["Day"]).reset_index().rename(
-            columns={"index": "day_id"})
-        return days_db
-
-    def create_slots_db(self):
-        slots_table = [pd.DataFrame(item["schedule"])["Time Slot"] for item in self.extracted_data]
-        slots_db = pd.DataFrame(pd.concat(slots_table, axis=0).unique(), columns=["Time Slot"]).reset_index().rename(
-            columns={"index": "Time_slot_id"})
-        return slots_db
-
-    def create_room_db(self):
-        room_table = [pd.DataFrame(item["schedule"])["Room No"] for item in self.extracted_data]
-        room_db = pd.DataFrame(
-            pd.Series([j for i in room_table for j in i]).replace({"Comp": "Computer block"}).unique(),
-            columns=["Room No"])
-        room_db = room_db.reset_index().rename(columns={"index": "Room ID"})
-        return room_db
-
-    def create_time_table_db(self, faculty_subject_data, room_db, slots_db, days_db):
-        time_table_data = []
+    def _intern(self):
+        """Streams every page once, interning dimension values and collecting fact rows as id columns."""
+        subjects = {}
+        faculties = {}
+        pairs = {}
+        days = {}
+        slots = {}
+        rooms = {}
+        pair_col, room_col, slot_col, day_col = array("q"), array("q"), array("q"), array("q")
         for item in self.extracted_data:
-            df = pd.DataFrame(item["schedule"]).merge(faculty_subject_data, on=["course code", 'Faculty'],
-                                                      how="left").drop(columns=["course code", 'Faculty', "Faculty_id"])
-            df = df.merge(room_db, on="Room No", how="left").drop(columns=["Room No"])
-            df = df.merge(slots_db, on="Time Slot", how="left").drop(columns=["Time Slot"])
-            df = df.merge(days_db, on="Day", how="left").drop(columns=["Day"])
-            time_table_data.append(df)
-        time_table_db = pd.concat(time_table_data).reset_index(drop=True).reset_index().rename(
-            columns={"index": "Time_table_id"})
-        return time_table_db.drop(columns=['dept'])
-
-    def process_all(self):
-        # section_db = self.create_section_db()
-        subject_db = self.create_subject_db()
-        faculty_db = self.create_faculty_db()
-        faculty_subject_db = self.create_faculty_subject_db(faculty_db)
-        days_db = self.create_days_db()
-        slots_db = self.create_slots_db()
-        room_db = self.create_room_db()
-        time_table_db = self.create_time_table_db(faculty_subject_db, room_db, slots_db, days_db)
-
+            details = item["course_details"]
+            for code, course, faculty in zip(details["course code"].tolist(), details["Course Name"].tolist(),
+                                             details["Faculty"].tolist()):
+                subjects.setdefault((code, course), None)
+                faculties.setdefault(faculty, len(faculties))
+                pairs.setdefault((faculty, code), len(pairs))
+            schedule = item["schedule"]
+            for day, slot, room, code, faculty in zip(schedule["Day"].tolist(), schedule["Time Slot"].tolist(),
+                                                      schedule["Room No"].tolist(), schedule["course code"].tolist(),
+                                                      schedule["Faculty"].tolist()):
+                day_col.append(days.setdefault(day, len(days)))
+                slot_col.append(slots.setdefault(slot, len(slots)))
+                # Facts take the aliased room's id, so "Comp" bookings count against "Computer block"
+                room_col.append(rooms.setdefault(ROOM_ALIASES.get(room, room), len(rooms)))
+                pair_col.append(pairs.get((faculty, code), -1))
+        return {"subjects": subjects, "faculties": faculties, "pairs": pairs, "days": days, "slots": slots,
+                "rooms": rooms, "facts": (pair_col, room_col, slot_col, day_col)}
+
+    @staticmethod
+    def _id_column(values) -> np.ndarray:
+        # -1 marks a failed lookup and becomes NaN, as the left merges used to produce
+        column = np.asarray(values, dtype=np.int64)
+        if (column < 0).any():
+            return np.where(column < 0, np.nan, column)
+        return column
+
+    def _build_tables(self, interned) -> dict:
+        subjects = list(interned["subjects"])
+        subject_db = pd.DataFrame({
+            "course code": [code for code, _ in subjects],
+            "Course": [course for _, course in subjects],
+            "Course Name": [self.inverse_course_mapping.get(course, np.nan) for _, course in subjects],
+        })
+
+        faculties = interned["faculties"]
+        faculty_db = pd.DataFrame({"Faculty_id": np.arange(len(faculties)), "Faculty": list(faculties)})
+
+        # fs_id groups course pairs by faculty (in Faculty_id order), keeping first-seen order within a faculty
+        pairs = list(interned["pairs"])
+        fs_order = sorted(range(len(pairs)), key=lambda pair_id: faculties[pairs[pair_id][0]])
+        fs_ids = np.empty(len(pairs) + 1, dtype=np.int64)
+        fs_ids[-1] = -1
+        fs_ids[fs_order] = np.arange(len(pairs))
+        faculty_subject_db = pd.DataFrame({
+            "fs_id": np.arange(len(pairs)),
+            "course code": [pairs[pair_id][1] for pair_id in fs_order],
+            "Faculty": [pairs[pair_id][0] for pair_id in fs_order],
+            "Faculty_id": [faculties[pairs[pair_id][0]] for pair_id in fs_order],
+        })
+
+        days_db = pd.DataFrame({"day_id": np.arange(len(interned["days"])), "Day": list(interned["days"])})
+        slots_db = pd.DataFrame({"Time_slot_id": np.arange(len(interned["slots"])),
+                                 "Time Slot": list(interned["slots"])})
+        room_db = pd.DataFrame({"Room ID": np.arange(len(interned["rooms"])), "Room No": list(interned["rooms"])})
+
+        pair_col, room_col, slot_col, day_col = interned["facts"]
+        # Missing pairs (-1) index the trailing -1 sentinel of fs_ids
+        time_table_db = pd.DataFrame({
+            "Time_table_id": np.arange(len(pair_col)),
+            "fs_id": self._id_column(fs_ids[np.asarray(pair_col, dtype=np.int64)]),
+            "Room ID": self._id_column(room_col),
+            "Time_slot_id": self._id_column(slot_col),
+            "day_id": self._id_column(day_col),
+        })
+        faculty_free_slots, room_free_slots = self._free_slot_tables(interned)
         return {
             # "section_db": section_db,
             "subject_db": subject_db,
@@ -287,6 +349,56 @@ class TimeTableProcessor:
             "days_db": days_db,
             "slots_db": slots_db,
             "room_db": room_db,
-            "time_table_db": time_table_db
+            "time_table_db": time_table_db,
+            "faculty_free_slots": faculty_free_slots,
+            "room_free_slots": room_free_slots
         }
 
+    @staticmethod
+    def _slot_bounds(slot: str):
+        start, end = slot.split("-")
+        return (datetime.time(*map(int, start.split(":"))), datetime.time(*map(int, end.split(":"))))
+
+    def _free_slot_tables(self, interned):
+        """Materializes the days x slots anti-joins that /faculty-schedule/ and /empty-rooms/ used to run per request."""
+        faculties = list(interned["faculties"])
+        rooms = list(interned["rooms"])
+        days = np.array(list(interned["days"]), dtype=object)
+        slots = np.array(list(interned["slots"]), dtype=object)
+        pair_col, room_col, slot_col, day_col = (np.asarray(column, dtype=np.int64) for column in interned["facts"])
+
+        # Trailing -1 so facts without a course pair map to "no faculty"
+        faculty_of_pair = np.array([interned["faculties"][faculty] for faculty, _ in interned["pairs"]] + [-1],
+                                   dtype=np.int64)
+        fact_faculty = faculty_of_pair[pair_col]
+        faculty_busy = np.zeros((len(faculties), len(days), len(slots)), dtype=bool)
+        known = fact_faculty >= 0
+        faculty_busy[fact_faculty[known], day_col[known], slot_col[known]] = True
+        room_busy = np.zeros((len(rooms), len(days), len(slots)), dtype=bool)
+        known = room_col >= 0
+        room_busy[room_col[known], day_col[known], slot_col[known]] = True
+
+        bounds = [self._slot_bounds(slot) for slot in slots]
+        starts = np.array([start for start, _ in bounds], dtype=object)
+        ends = np.array([end for _, end in bounds], dtype=object)
+
+        def free_slots(busy, owner_columns):
+            owner, day_ids, slot_ids = np.nonzero(~busy)
+            columns = {name: values[owner] for name, values in owner_columns.items()}
+            columns.update({"day_id": day_ids, "Day": days[day_ids],
+                            "Time_slot_id": slot_ids, "Time Slot": slots[slot_ids],
+                            "start_time": starts[slot_ids], "end_time": ends[slot_ids]})
+            return pd.DataFrame(columns)
+
+        faculty_free_slots = free_slots(faculty_busy, {"Faculty": np.array(faculties, dtype=object)})
+        room_free_slots = free_slots(room_busy, {"Room ID": np.arange(len(rooms)),
+                                                 "Room No": np.array(rooms, dtype=object)})
+        return faculty_free_slots, room_free_slots
+
+    def process_all(self):
+        if not self.extracted_data:
+            # The merge-based build failed here too (pd.concat of no pages); empty tables must never
+            # replace the live ones
+            raise ValueError("No timetable pages were extracted from the PDF")
+        with ingest_stage("table_build", self.profiler):
+            return self._build_tables(self._intern())
@@ -0,0 +1,126 @@
+"""
+Post-ingest checks on the tables built by TimeTableProcessor.
+
+validate_timetable() combines what Data_extractor had to drop while parsing (cells
+without a room number, cells whose course is missing from the course table,
+courses missing from the course mapping), time_table_db rows whose ids did not
+resolve and so cannot be checked, and scheduling conflicts found by
+group-bys over time_table_db: a room booked for two different faculty/course
+pairs in the same day/slot, and a faculty member placed in two rooms at once.
+An upload that produced no timetable rows at all (pages were found but every
+cell was dropped) is reported as `empty_timetable`; such a version must never
+be activated.
+"""
+import numpy as np
+import pandas as pd
+
+# Longest list returned per issue kind; the counts always cover everything
+MAX_REPORTED = 200
+SLOT_KEYS = ["day_id", "Time_slot_id"]
+ID_COLUMNS = ["fs_id", "Room ID", "Time_slot_id", "day_id"]
+
+
+def _records(df: pd.DataFrame) -> list:
+    return df.head(MAX_REPORTED).to_dict("records")
+
+
+def unresolved_facts(tables: dict) -> pd.DataFrame:
+    """time_table_db rows with an id that did not resolve (e.g. a faculty/course pair missing from the course table), named where possible."""
+    facts = tables["time_table_db"]
+    missing = facts[ID_COLUMNS].isna()
+    unresolved = missing.any(axis=1)
+    facts, missing = facts[unresolved], missing[unresolved].to_numpy()
+    faculty_subject_db = tables["faculty_subject_db"].set_index("fs_id")
+    unresolved = pd.DataFrame({
+        "Time_table_id": facts["Time_table_id"],
+        "Day": facts["day_id"].map(tables["days_db"].set_index("day_id")["Day"]),
+        "Time Slot": facts["Time_slot_id"].map(tables["slots_db"].set_index("Time_slot_id")["Time Slot"]),
+        "Faculty": facts["fs_id"].map(faculty_subject_db["Faculty"]),
+        "course code": facts["fs_id"].map(faculty_subject_db["course code"]),
+        "missing": [[column for column, absent in zip(ID_COLUMNS, row) if absent] for row in missing],
+    })
+    # NaN is not valid JSON; unresolved names become null in the response
+    return unresolved.astype(object).where(unresolved.notna(), None)
+
+
+def _facts(tables: dict) -> pd.DataFrame:
+    """time_table_db with names attached, keeping only fully resolved rows that occupy a real room and faculty.
+
+    Rows with unresolved ids cannot be checked for conflicts; unresolved_facts() reports them.
+    """
+    facts = tables["time_table_db"].dropna(subset=ID_COLUMNS)
+    # Every id is the row position in its dimension table, so names are plain array lookups
+    fs_id = facts["fs_id"].to_numpy(dtype=np.int64)
+    room_id = facts["Room ID"].to_numpy(dtype=np.int64)
+    day_id = facts["day_id"].to_numpy(dtype=np.int64)
+    slot_id = facts["Time_slot_id"].to_numpy(dtype=np.int64)
+    faculty_subject_db = tables["faculty_subject_db"]
+    facts = pd.DataFrame({
+        "day_id": day_id,
+        "Time_slot_id": slot_id,
+        "fs_id": fs_id,
+        "Room ID": room_id,
+        "Day": tables["days_db"]["Day"].to_numpy()[day_id],
+        "Time Slot": tables["slots_db"]["Time Slot"].to_numpy()[slot_id],
+        "Room No": tables["room_db"]["Room No"].to_numpy()[room_id],
+        "Faculty": faculty_subject_db["Faculty"].to_numpy()[fs_id],
+        "course code": faculty_subject_db["course code"].to_numpy()[fs_id],
+    })
+    return facts[(facts["Faculty"] != "Free") & (facts["Room No"] != "Free")]
+
+
+def _conflicts(facts: pd.DataFrame, keys: list, distinct: str, listed: list) -> pd.DataFrame:
+    """Groups of `keys` with more than one distinct `distinct` value, listing the clashing `listed` values."""
+    clashing = facts[facts.groupby(keys)[distinct].transform("nunique") > 1]
+    clashing = clashing.drop_duplicates(keys + [distinct]).sort_values(keys + listed)
+    conflicts = clashing.groupby(keys, sort=False).agg(
+        **{"Day": ("Day", "first"), "Time Slot": ("Time Slot", "first")},
+        **{column: (column, list) for column in listed})
+    return conflicts.reset_index()
+
+
+def room_conflicts(facts: pd.DataFrame) -> pd.DataFrame:
+    # Sections sharing one faculty/course pair (a combined class) are not a clash
+    conflicts = _conflicts(facts, SLOT_KEYS + ["Room No"], "fs_id", ["Faculty", "course code"])
+    return conflicts[["Day", "Time Slot", "Room No", "Faculty", "course code"]]
+
+
+def faculty_conflicts(facts: pd.DataFrame) -> pd.DataFrame:
+    conflicts = _conflicts(facts, SLOT_KEYS + ["Faculty"], "Room ID", ["Room No", "course code"])
+    return conflicts[["Day", "Time Slot", "Faculty", "Room No", "course code"]]
+
+
+def validate_timetable(tables: dict, dropped_cells=(), unmapped_courses=()) -> dict:
+    """Builds the validation report returned by the timetable upload.
+
+    `tables` is the output of TimeTableProcessor.process_all; `dropped_cells` and
+    `unmapped_courses` are the lists collected by Data_extractor. `ok` is False
+    when any issue was found, including an empty timetable.
+    """
+    empty = tables["time_table_db"].empty
+    unresolved = unresolved_facts(tables)
+    facts = _facts(tables)
+    rooms = room_conflicts(facts)
+    faculty = faculty_conflicts(facts)
+
+    dropped = pd.DataFrame(list(dropped_cells), columns=["page", "Day", "Time Slot", "cell", "reason"])
+    # One entry per course, with every page it was missing on
+    unmapped = pd.DataFrame(list(unmapped_courses), columns=["page", "course code", "Course", "Faculty"])
+    unmapped = (unmapped.groupby(["course code", "Course"], sort=True)
+                .agg(Faculty=("Faculty", lambda values: sorted(set(values))),
+                     pages=("page", lambda values: sorted(set(values))))
+                .reset_index())
+
+    counts = {"empty_timetable": int(empty), "dropped_cells": len(dropped), "unmapped_courses": len(unmapped),
+              "unresolved_facts": len(unresolved),
+              "room_conflicts": len(rooms), "faculty_conflicts": len(faculty)}
+    return {
+        "ok": not any(counts.values()),
+        "counts": counts,
+        "empty_timetable": empty,
+        "dropped_cells": _records(dropped),
+        "unmapped_courses": _records(unmapped),
+        "unresolved_facts": _records(unresolved),
+        "room_conflicts": _records(rooms),
+        "faculty_conflicts": _records(faculty),
+    }
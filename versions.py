@@ -0,0 +1,128 @@
+"""
+Versioned timetable snapshots.
+
+Every upload is written to its own Postgres schema (`tt_<version>`) and recorded
+in `timetable_versions`. The single-row `timetable_active` table points at the
+version the read API serves, so activating or rolling back is one UPDATE. When
+no version has been activated yet, the read API falls back to the legacy tables
+in `public`.
+
+Each version also records its ingest validation outcome. activate() never serves
+a version whose timetable came out empty, and a version that failed validation
+and was never live needs an explicit force.
+"""
+import re
+import secrets
+from datetime import datetime
+from collections import OrderedDict
+
+LEGACY_VERSION = "legacy"
+LEGACY_SCHEMA = "public"
+
+VERSION_DDL = [
+    '''CREATE TABLE IF NOT EXISTS timetable_versions (
+           version TEXT PRIMARY KEY,
+           term TEXT NOT NULL,
+           schema_name TEXT NOT NULL UNIQUE,
+           created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+           activated_at TIMESTAMPTZ,
+           validation_ok BOOLEAN,
+           empty_timetable BOOLEAN NOT NULL DEFAULT FALSE
+       )''',
+    '''CREATE TABLE IF NOT EXISTS timetable_active (
+           id INT PRIMARY KEY CHECK (id = 1),
+           version TEXT NOT NULL REFERENCES timetable_versions (version)
+       )''',
+]
+
+# Adds the validation columns to registries created before they existed (run once at admin startup).
+# Versions registered before that keep validation_ok NULL and are treated as valid.
+VERSION_MIGRATIONS = [
+    '''ALTER TABLE timetable_versions ADD COLUMN IF NOT EXISTS validation_ok BOOLEAN''',
+    '''ALTER TABLE timetable_versions ADD COLUMN IF NOT EXISTS empty_timetable BOOLEAN NOT NULL DEFAULT FALSE''',
+]
+
+register_version_query = """
+INSERT INTO timetable_versions (version, term, schema_name, validation_ok, empty_timetable)
+VALUES (:version, :term, :schema_name, :validation_ok, :empty_timetable)
+"""
+
+version_schema_query = """
+SELECT schema_name, validation_ok, empty_timetable, activated_at FROM timetable_versions WHERE version = :version
+"""
+
+activate_version_queries = [
+    """
+    INSERT INTO timetable_active (id, version) VALUES (1, :version)
+    ON CONFLICT (id) DO UPDATE SET version = EXCLUDED.version
+    """,
+    """
+    UPDATE timetable_versions SET activated_at = now() WHERE version = :version
+    """,
+]
+
+list_versions_query = """
+SELECT v.version, v.term, v.schema_name, v.created_at, v.activated_at, v.validation_ok, v.empty_timetable,
+       COALESCE(a.version = v.version, FALSE) AS active
+FROM timetable_versions v
+LEFT JOIN timetable_active a ON a.id = 1
+ORDER BY v.created_at DESC
+"""
+
+active_version_query = """
+SELECT v.version, v.schema_name
+FROM timetable_active a
+JOIN timetable_versions v ON v.version = a.version
+WHERE a.id = 1
+"""
+
+
+class ActivationRefused(Exception):
+    """Raised by activate() for a version that must not (or not without force) go live."""
+
+
+def make_version(term: str) -> str:
+    """Builds a sortable version id such as `2025_odd_20250714t093000123456_3f9a` from the term label."""
+    slug = re.sub(r"[^a-z0-9]+", "_", term.lower()).strip("_")[:30] or "term"
+    # Microseconds plus a random suffix keep double-submitted uploads from sharing a version
+    return f"{slug}_{datetime.now().strftime('%Y%m%dT%H%M%S%f').lower()}_{secrets.token_hex(2)}"
+
+
+def schema_for(version: str) -> str:
+    schema = f"tt_{version}"
+    # Schema names are interpolated into SQL, so only ever accept what make_version produces
+    if not re.fullmatch(r"tt_[a-z0-9_]{1,60}", schema):
+        raise ValueError(f"Invalid timetable version: {version!r}")
+    return schema
+
+
+class VersionCache:
+    """Small LRU of query results for one timetable version.
+
+    Entries belong to the version they were computed for; the first lookup under a new
+    version drops them, so a switch only costs cache misses until the new data is warm.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.version = None
+        self._entries = OrderedDict()
+
+    def get(self, version: str, key, default=None):
+        if version != self.version:
+            self.version = version
+            self._entries.clear()
+            return default
+        if key not in self._entries:
+            return default
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def put(self, version: str, key, value):
+        if version != self.version:
+            self.version = version
+            self._entries.clear()
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)